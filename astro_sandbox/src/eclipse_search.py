@@ -0,0 +1,201 @@
+import functools
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import spiceypy as spice
+from scipy.optimize import brentq, minimize_scalar
+
+# Eclipse search over long time spans, using the same geometry as eclipses.ipynb
+# but on whole arrays of epochs:
+#   1 - sample Sun and Moon positions wrt Earth on a coarse grid (one SPICE call per
+#       body for the whole grid, radii looked up once per body)
+#   2 - every local minimum of the contact function (apparent separation minus the
+#       sum of apparent radii) is a new/full moon; refine it with a bounded minimizer
+#   3 - if the refined minimum is below zero there is an eclipse: its first and last
+#       contacts are the roots of the contact function on either side (brentq)
+# Only the kernels furnished locally are read (see load_kernels), nothing is fetched.
+#
+#   load_kernels("../data")
+#   events = find_eclipses(datetime(2024, 1, 1), datetime(2026, 12, 31))
+#
+# events is a DataFrame with one row per eclipse: type, start, maximum, end (UTC)
+# and magnitude (fraction of the Sun's diameter covered for solar eclipses, umbral
+# magnitude for partial/total lunar eclipses and penumbral magnitude otherwise).
+
+KERNELS = (
+    "naif0012.tls",  # Leap seconds - conversion of earth time to ephemeris time
+    "de440s.bsp",    # Ephemeris data - position and velocities
+    "pck00011.tpc",  # Planetary constants - radius, spin axes, rotation rates etc.
+)
+
+DEFAULT_STEP_HOURS = 6  # coarse grid; minima are refined, so this only needs to resolve one per lunation
+MAX_STEP_HOURS = 24
+
+
+def load_kernels(data_dir="../data"):
+    for name in KERNELS:
+        spice.furnsh(os.path.join(data_dir, name))
+    mean_radius_km.cache_clear()  # new planetary constants may have been loaded
+
+
+# https://naif.jpl.nasa.gov/pub/naif/toolkit_docs/IDL/icy/cspice_bodvrd.html
+@functools.lru_cache(maxsize=None)
+def mean_radius_km(body_name):
+    # SPICE stores 3 radii (bodies are not perfect spheres), we use their mean
+    radii = spice.bodvrd(body_name.upper(), "RADII", 3)[1]
+    return float(np.mean(radii))
+
+
+def to_et(t):
+    # datetime (UTC), UTC string or ephemeris time in seconds past J2000
+    if isinstance(t, datetime):
+        return spice.utc2et(t.strftime("%Y-%m-%dT%H:%M:%S"))
+    if isinstance(t, str):
+        return spice.utc2et(t)
+    return float(t)
+
+
+def angle_between(v1, v2):
+    # Row-wise angle between vectors; atan2 keeps full precision for small angles,
+    # where contacts are found
+    cross = np.linalg.norm(np.cross(v1, v2), axis=-1)
+    dot = np.einsum("ij,ij->i", v1, v2)
+    return np.arctan2(cross, dot)
+
+
+def angular_radius(radius_km, dist_km):
+    return np.arcsin(np.clip(radius_km / np.maximum(dist_km, 1e-9), 0.0, 1.0))
+
+
+def sample_positions(ets):
+    # Geometric positions (km, J2000) of the Sun and the Moon wrt Earth at every epoch
+    ets = np.atleast_1d(np.asarray(ets, dtype=float))
+    r_es = spice.spkpos("SUN", ets, "J2000", "NONE", "EARTH")[0]
+    r_em = spice.spkpos("MOON", ets, "J2000", "NONE", "EARTH")[0]
+    return r_es, r_em
+
+
+def solar_geometry(ets):
+    r_es, r_em = sample_positions(ets)
+    d_es = np.linalg.norm(r_es, axis=1)
+    d_em = np.linalg.norm(r_em, axis=1)
+    a_sun = angular_radius(mean_radius_km("SUN"), d_es)
+    a_moon = angular_radius(mean_radius_km("MOON"), d_em)
+    # Geocentric separation reduced by the lunar horizontal parallax: the smallest
+    # separation seen from anywhere on Earth (negative once the Moon's centre crosses
+    # the Sun's as seen from some observer, which keeps the contact function smooth)
+    offset = angle_between(r_es, r_em) - angular_radius(mean_radius_km("EARTH"), d_em)
+    return {
+        "a_sun": a_sun,
+        "a_moon": a_moon,
+        "offset": offset,
+        "contact": offset - (a_sun + a_moon),
+    }
+
+
+def lunar_geometry(ets):
+    r_es, r_em = sample_positions(ets)
+    r_ms = r_es - r_em  # Sun wrt Moon
+    d_me = np.linalg.norm(r_em, axis=1)
+    R_moon = mean_radius_km("MOON")
+    # apparent radii of Earth and Sun from the Moon give the shadow radii at the Moon (km)
+    a_E = angular_radius(mean_radius_km("EARTH"), d_me)
+    a_S = angular_radius(mean_radius_km("SUN"), np.linalg.norm(r_ms, axis=1))
+    r_umb = d_me * np.tan(np.maximum(0.0, a_E - a_S))
+    r_pen = d_me * np.tan(a_E + a_S)
+    # distance of the Moon's centre from the shadow axis (km)
+    s = d_me * angle_between(r_em, -r_ms)
+    return {
+        "r_umb": r_umb,
+        "r_pen": r_pen,
+        "s": s,
+        "umbral_magnitude": (r_umb + R_moon - s) / (2.0 * R_moon),
+        "penumbral_magnitude": (r_pen + R_moon - s) / (2.0 * R_moon),
+        "contact": s - (r_pen + R_moon),
+    }
+
+
+def _classify_solar(geometry):
+    a_sun, a_moon = geometry["a_sun"], geometry["a_moon"]
+    offset = np.maximum(0.0, geometry["offset"])
+    central = offset <= np.abs(a_moon - a_sun)
+    kind = np.where(central, np.where(a_moon > a_sun, "total solar", "annular solar"), "partial solar")
+    return kind, (a_sun + a_moon - offset) / (2.0 * a_sun)
+
+
+def _classify_lunar(geometry):
+    umbral, penumbral = geometry["umbral_magnitude"], geometry["penumbral_magnitude"]
+    kind = np.where(umbral >= 1.0, "total lunar", np.where(umbral > 0, "partial lunar", "penumbral lunar"))
+    return kind, np.where(umbral > 0, umbral, penumbral)
+
+
+def _contacts(geometry, et0, et1, step, tol):
+    # (start, maximum, end) epochs of every dip of the contact function below zero
+    # whose maximum lies in [et0, et1]
+    ets = np.arange(et0 - step, et1 + 2 * step, step)
+    g = geometry(ets)["contact"]
+
+    def contact(et):
+        return geometry(et)["contact"][0]
+
+    minima = np.flatnonzero((g[1:-1] <= g[:-2]) & (g[1:-1] < g[2:])) + 1
+    # the true minimum lies at most about one grid difference below the sampled one
+    margin = np.maximum(g[minima - 1] - g[minima], g[minima + 1] - g[minima])
+    events = []
+    for i in minima[g[minima] < margin]:
+        best = minimize_scalar(contact, bounds=(ets[i - 1], ets[i + 1]), method="bounded",
+                               options={"xatol": tol})
+        if best.fun >= 0 or not et0 <= best.x <= et1:
+            continue
+        lo, hi = i - 1, i + 1
+        while lo > 0 and g[lo] < 0:
+            lo -= 1
+        while hi < len(ets) - 1 and g[hi] < 0:
+            hi += 1
+        start = brentq(contact, ets[lo], best.x, xtol=tol) if g[lo] > 0 else ets[lo]
+        end = brentq(contact, best.x, ets[hi], xtol=tol) if g[hi] > 0 else ets[hi]
+        events.append((start, best.x, end))
+    return np.array(events, dtype=float).reshape(-1, 3)
+
+
+def _utc(ets):
+    return pd.to_datetime(list(spice.et2utc(ets, "ISOC", 0))) if len(ets) else pd.to_datetime([])
+
+
+def _event_table(geometry, classify, start, end, step_hours, tol_seconds, min_magnitude):
+    if not 0 < step_hours <= MAX_STEP_HOURS:
+        raise ValueError(f"step_hours must be in (0, {MAX_STEP_HOURS}], got {step_hours}")
+    contacts = _contacts(geometry, to_et(start), to_et(end), step_hours * 3600.0, tol_seconds)
+    kind, magnitude = classify(geometry(contacts[:, 1])) if len(contacts) else (np.array([]), np.array([]))
+    keep = magnitude >= min_magnitude
+    contacts = contacts[keep]
+    return pd.DataFrame({
+        "type": kind[keep],
+        "start": _utc(contacts[:, 0]),
+        "maximum": _utc(contacts[:, 1]),
+        "end": _utc(contacts[:, 2]),
+        "magnitude": magnitude[keep],
+    })
+
+
+def find_solar_eclipses(start, end, step_hours=DEFAULT_STEP_HOURS, tol_seconds=1.0, min_magnitude=0.0):
+    # Solar eclipses visible from anywhere on Earth; start/end are the first and last
+    # contacts of the Moon's disk with the Sun's
+    return _event_table(solar_geometry, _classify_solar, start, end, step_hours, tol_seconds, min_magnitude)
+
+
+def find_lunar_eclipses(start, end, step_hours=DEFAULT_STEP_HOURS, tol_seconds=1.0, min_magnitude=0.0):
+    # Lunar eclipses; start/end are the first and last contacts with the penumbra
+    return _event_table(lunar_geometry, _classify_lunar, start, end, step_hours, tol_seconds, min_magnitude)
+
+
+def find_eclipses(start, end, step_hours=DEFAULT_STEP_HOURS, tol_seconds=1.0, min_magnitude=0.0):
+    # Solar and lunar eclipses between start and end (datetimes, UTC strings or ETs),
+    # ordered by time of maximum
+    events = pd.concat([
+        find_solar_eclipses(start, end, step_hours, tol_seconds, min_magnitude),
+        find_lunar_eclipses(start, end, step_hours, tol_seconds, min_magnitude),
+    ], ignore_index=True)
+    return events.sort_values("maximum", ignore_index=True)
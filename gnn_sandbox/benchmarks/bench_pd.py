@@ -0,0 +1,227 @@
+# Benchmarks for the prisoner's dilemma simulation.
+#
+# Sweeps node count, average degree, rewiring probability, round count and strategy
+# mix, and times each phase of the loop (play round, collect features, update
+# actions) plus an end-to-end run_simulation, for the networkx and array backends.
+# Every result reports wall time, rounds/sec, edges/sec, the peak memory allocated
+# during the phase (tracemalloc), the largest growth of the resident set across one
+# call of the phase and the process-wide max RSS (a high-water mark of the whole run,
+# not of the phase).
+#
+# Run from gnn_sandbox/:
+#   python benchmarks/bench_pd.py --quick --out bench.json
+#   python benchmarks/bench_pd.py --nodes 1000 10000 --degree 4 8 --rewiring 0.1 0.3 \
+#       --rounds 20 --mix-file src/config.json --backend networkx array --out bench.json
+# Compare two result files (exit code 1 on regressions):
+#   python benchmarks/bench_pd.py --compare old.json new.json --threshold 0.15
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.prisoner_dilemma import (generate_graph, initialize_agent_actions, play_pd_round,
+                                  get_node_features, update_agent_actions, run_simulation,
+                                  setup_engine)
+
+PHASES = ('play_round', 'features', 'update', 'run_simulation')
+
+
+def rss_bytes():
+    # Current resident set size, None where it cannot be read
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        return None
+
+
+def max_rss_bytes():
+    try:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if sys.platform == 'darwin' else rss * 1024
+    except ImportError:
+        import psutil
+        return psutil.Process().memory_info().peak_wset
+
+
+def load_mixes(path):
+    # A config.json-style file: {"strategy_distribution": {...}} for one mix or
+    # {"strategy_distributions": [{...}, ...]} for several; null means uniform random
+    if path is None:
+        return [None]
+    with open(path) as f:
+        config = json.load(f)
+    if 'strategy_distributions' in config:
+        return config['strategy_distributions']
+    return [config.get('strategy_distribution')]
+
+
+class PhaseTimer:
+    def __init__(self, trace_memory):
+        self.trace_memory = trace_memory
+        self.wall = dict.fromkeys(PHASES, 0.0)
+        self.peak = dict.fromkeys(PHASES, 0)
+        self.rss_delta = dict.fromkeys(PHASES, 0)
+        self.max_rss = dict.fromkeys(PHASES, 0)
+
+    def run(self, phase, func, *args, **kwargs):
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            start_mem = tracemalloc.get_traced_memory()[0]
+            start_rss = rss_bytes()
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.wall[phase] += time.perf_counter() - start
+        if self.trace_memory:
+            self.peak[phase] = max(self.peak[phase], tracemalloc.get_traced_memory()[1] - start_mem)
+            end_rss = rss_bytes()
+            if start_rss is not None and end_rss is not None:
+                self.rss_delta[phase] = max(self.rss_delta[phase], end_rss - start_rss)
+            self.max_rss[phase] = max_rss_bytes()
+        return result
+
+
+def run_case(case, timer):
+    backend, n, k, p, rounds, mix, seed = (case[name] for name in
+                                           ('backend', 'num_nodes', 'degree', 'rewiring', 'rounds', 'mix', 'seed'))
+    if backend == 'networkx':
+        np.random.seed(seed)
+        random.seed(seed)
+        G = generate_graph(num_nodes=n, k=k, p=p, seed=seed)
+        initialize_agent_actions(G, config=mix)
+        for round_num in range(rounds):
+            timer.run('play_round', play_pd_round, G)
+            timer.run('features', lambda: [get_node_features(G, node, round_num) for node in G.nodes])
+            timer.run('update', update_agent_actions, G)
+        np.random.seed(seed)
+        random.seed(seed)
+        timer.run('run_simulation', run_simulation, num_rounds=rounds, num_nodes=n,
+                  average_connection=k, rewiring=p, strategy_config=mix)
+        return G.number_of_edges()
+
+    engine = setup_engine(n, k, p, strategy_config=mix, rng=np.random.default_rng(seed))
+    for round_num in range(rounds):
+        timer.run('play_round', engine.play_round)
+        timer.run('features', engine.node_features, round_num)
+        timer.run('update', engine.update_actions)
+    timer.run('run_simulation', run_simulation, num_rounds=rounds, num_nodes=n, average_connection=k,
+              rewiring=p, strategy_config=mix, backend='array', rng=np.random.default_rng(seed))
+    return len(engine.indices) // 2
+
+
+def benchmark(case, repeat):
+    # Best wall time over repeat runs; memory from one extra traced run
+    best = None
+    for _ in range(repeat):
+        timer = PhaseTimer(trace_memory=False)
+        num_edges = run_case(case, timer)
+        best = timer.wall if best is None else {ph: min(best[ph], timer.wall[ph]) for ph in PHASES}
+    tracemalloc.start()
+    mem_timer = PhaseTimer(trace_memory=True)
+    run_case(case, mem_timer)
+    tracemalloc.stop()
+
+    records = []
+    for phase in PHASES:
+        wall = best[phase]
+        records.append(dict(case, phase=phase, num_edges=num_edges, wall_s=wall,
+                            rounds_per_s=case['rounds'] / wall if wall else None,
+                            edges_per_s=num_edges * case['rounds'] / wall if wall else None,
+                            peak_alloc_bytes=mem_timer.peak[phase], rss_delta_bytes=mem_timer.rss_delta[phase],
+                            process_max_rss_bytes=mem_timer.max_rss[phase]))
+    return records
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def case_key(record):
+    mix = json.dumps(record['mix'], sort_keys=True)
+    return (record['backend'], record['num_nodes'], record['degree'], record['rewiring'],
+            record['rounds'], mix, record['phase'])
+
+
+def compare(old_path, new_path, threshold):
+    # Print the wall-time ratio new/old per case and phase; True if none regressed
+    with open(old_path) as f:
+        old = {case_key(r): r for r in json.load(f)['results']}
+    with open(new_path) as f:
+        new = {case_key(r): r for r in json.load(f)['results']}
+    ok = True
+    print(f"{'Backend':<10}{'Nodes':<10}{'Degree':<8}{'Rewire':<8}{'Rounds':<8}{'Phase':<16}"
+          f"{'Old (s)':<12}{'New (s)':<12}{'Ratio':<8}")
+    for key in sorted(set(old) & set(new), key=str):
+        before, after = old[key]['wall_s'], new[key]['wall_s']
+        ratio = after / before if before else float('inf')
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = '  REGRESSION'
+            ok = False
+        backend, n, k, p, rounds, _, phase = key
+        print(f"{backend:<10}{n:<10}{k:<8}{p:<8}{rounds:<8}{phase:<16}{before:<12.4f}{after:<12.4f}{ratio:<8.2f}{flag}")
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prisoner's dilemma simulation benchmarks")
+    parser.add_argument('--nodes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--degree', type=int, nargs='+', default=[6])
+    parser.add_argument('--rewiring', type=float, nargs='+', default=[0.3])
+    parser.add_argument('--rounds', type=int, nargs='+', default=[10])
+    parser.add_argument('--mix-file', default=None, help="config.json-style strategy distribution(s)")
+    parser.add_argument('--backend', nargs='+', default=['networkx', 'array'], choices=['networkx', 'array'])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--quick', action='store_true', help="small sizes for a smoke run")
+    parser.add_argument('--out', default=None, help="write results as JSON")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    parser.add_argument('--threshold', type=float, default=0.15, help="allowed slowdown, 0.15 = 15%%")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return 0 if compare(*args.compare, args.threshold) else 1
+    if args.quick:
+        args.nodes, args.rounds, args.repeat = [200, 2000], [5], 1
+
+    results = []
+    for backend, n, k, p, rounds, mix in itertools.product(args.backend, args.nodes, args.degree, args.rewiring,
+                                                           args.rounds, load_mixes(args.mix_file)):
+        case = dict(backend=backend, num_nodes=n, degree=k, rewiring=p, rounds=rounds, mix=mix, seed=args.seed)
+        for record in benchmark(case, args.repeat):
+            results.append(record)
+            print(f"{backend:<10}{n:<10}{k:<4}{p:<6}{rounds:<6}{record['phase']:<16}"
+                  f"{record['wall_s']:<10.4f}{record['edges_per_s'] or 0:<14.0f}"
+                  f"{record['peak_alloc_bytes'] / 2**20:<8.1f}MiB")
+
+    if args.out:
+        meta = {'commit': git_commit(), 'python': platform.python_version(), 'numpy': np.__version__,
+                'platform': platform.platform(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+        with open(args.out, 'w') as f:
+            json.dump({'meta': meta, 'results': results}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
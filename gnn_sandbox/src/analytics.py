@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+from src.hooks import SimulationHook
+
+# Per-strategy payoff statistics as a vectorized group-by over the node state arrays.
+# Nodes are sorted by strategy once, so each round is one gather of the payoffs and
+# actions followed by np.add/minimum/maximum.reduceat over the strategy segments:
+# O(num_nodes) NumPy work and no Python loop over nodes.
+# Stats are (num_strategies, len(STAT_COLUMNS)) float64 arrays; strategies without
+# nodes get count 0 and NaN elsewhere. payoff_var is the population variance.
+
+STAT_COLUMNS = ('count', 'mean_payoff', 'min_payoff', 'max_payoff', 'total_payoff',
+                'coop_rate', 'payoff_var')
+
+
+class StrategyGroups:
+    # Node order and segment boundaries of each strategy, reused every round
+    def __init__(self, strategy, num_strategies):
+        strategy = np.asarray(strategy)
+        self.num_strategies = num_strategies
+        self.order = np.argsort(strategy, kind='stable')
+        self.count = np.bincount(strategy, minlength=num_strategies)
+        self.present = np.flatnonzero(self.count)
+        self.starts = np.concatenate([[0], np.cumsum(self.count)[:-1]])[self.present]
+        self.group_of = strategy[self.order]
+
+    def stats(self, payoff, action):
+        out = np.full((self.num_strategies, len(STAT_COLUMNS)), np.nan)
+        out[:, 0] = self.count
+        if len(self.present) == 0:
+            return out
+        p = np.asarray(payoff, dtype=np.float64)[self.order]
+        a = np.asarray(action, dtype=np.float64)[self.order]
+        count = self.count[self.present]
+        total = np.add.reduceat(p, self.starts)
+        mean = total / count
+        rows = self.present
+        out[rows, 1] = mean
+        deviation = p - out[self.group_of, 1]
+        out[rows, 2] = np.minimum.reduceat(p, self.starts)
+        out[rows, 3] = np.maximum.reduceat(p, self.starts)
+        out[rows, 4] = total
+        out[rows, 5] = np.add.reduceat(a, self.starts) / count
+        out[rows, 6] = np.add.reduceat(deviation * deviation, self.starts) / count
+        return out
+
+
+def strategy_stats(strategy, payoff, action, num_strategies=None):
+    # One-off group-by; for repeated calls on the same nodes keep a StrategyGroups
+    if num_strategies is None:
+        num_strategies = int(np.max(strategy)) + 1 if len(strategy) else 0
+    return StrategyGroups(strategy, num_strategies).stats(payoff, action)
+
+
+def stats_frame(stats, strategy_names, round_num=None):
+    # Tidy DataFrame, one row per strategy that has nodes
+    df = pd.DataFrame(stats, columns=STAT_COLUMNS)
+    df.insert(0, 'strategy', list(strategy_names))
+    df['count'] = df['count'].astype(np.int64)
+    if round_num is not None:
+        df.insert(0, 'round', round_num)
+    return df[df['count'] > 0].reset_index(drop=True)
+
+
+class StrategyAnalytics(SimulationHook):
+    # Accumulates the stats of every round during the run (after the 'play' phase,
+    # i.e. payoffs and the actions that earned them), so no trace has to be rescanned.
+    # Each round adds one small (strategies, stats) block; memory does not grow with nodes.
+    def __init__(self):
+        self.groups = None
+        self.strategy_names = None
+        self.rounds = []
+        self._rows = []
+
+    def after_phase(self, engine, round_num, phase):
+        if phase != 'play':
+            return
+        if self.groups is None:
+            self.strategy_names = list(engine.strategy_names)
+            self.groups = StrategyGroups(engine.strategy, len(self.strategy_names))
+        self._rows.append(self.groups.stats(engine.payoff, engine.action))
+        self.rounds.append(round_num)
+
+    @property
+    def array(self):
+        # (rounds, strategies, stats) float64, strategies in engine.strategy_names order
+        if not self._rows:
+            return np.empty((0, len(self.strategy_names or ()), len(STAT_COLUMNS)))
+        return np.stack(self._rows)
+
+    def stat(self, column):
+        # (rounds, strategies) slice of one statistic
+        return self.array[:, :, STAT_COLUMNS.index(column)]
+
+    def to_dataframe(self):
+        array = self.array
+        if len(array) == 0:
+            return pd.DataFrame(columns=('round', 'strategy') + STAT_COLUMNS)
+        num_rounds, num_strategies = array.shape[:2]
+        df = pd.DataFrame(array.reshape(-1, len(STAT_COLUMNS)), columns=STAT_COLUMNS)
+        df.insert(0, 'strategy', np.tile(np.asarray(self.strategy_names, dtype=object), num_rounds))
+        df.insert(0, 'round', np.repeat(np.asarray(self.rounds), num_strategies))
+        df['count'] = df['count'].astype(np.int64)
+        return df[df['count'] > 0].reset_index(drop=True)
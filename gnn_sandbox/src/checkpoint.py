@@ -0,0 +1,155 @@
+import json
+import os
+import shutil
+
+import numpy as np
+from src.hooks import SimulationHook
+from src.pd_engine import PDEngine
+
+# Checkpoints of the full PDEngine state: a directory of .npy arrays (graph, per-node
+# state and the neighbour memory ring buffer) plus meta.json (round, memory head,
+# strategy names, payoff table, node labels and the RNG state).
+# Loading memory-maps the arrays, so resuming costs little more than opening the
+# files. State arrays are mapped copy-on-write (mmap_mode='c'): a loaded engine
+# writes to private pages and never to the snapshot, so any number of continuations
+# can branch from the same checkpoint.
+# A resumed engine reproduces the original run bit for bit when the RNG state is
+# restored (the default); pass a new rng to explore a different continuation.
+#
+#   run_simulation(..., backend='array', checkpoint_path='ckpt/round_{round}', checkpoint_every=50)
+#   df = run_simulation(num_rounds=200, backend='array', resume_from='ckpt/round_100')
+
+CHECKPOINT_VERSION = 1
+STATIC_ARRAYS = ('indptr', 'indices', 'strategy')  # never change during a run
+STATE_ARRAYS = ('action', 'payoff', 'prev_payoff', 'triggered', 'memory_history')
+
+
+def _rng_state(rng):
+    # (JSON-able description, legacy key array or None)
+    if isinstance(rng, np.random.Generator):
+        state = {key: value.tolist() if isinstance(value, np.ndarray) else value
+                 for key, value in rng.bit_generator.state.items()}
+        if isinstance(state.get('state'), dict):
+            state['state'] = {key: value.tolist() if isinstance(value, np.ndarray) else value
+                              for key, value in state['state'].items()}
+        return {'kind': 'generator', 'state': state}, None
+    kind = 'global' if rng is np.random else 'random_state'
+    name, keys, pos, has_gauss, cached_gaussian = rng.get_state()
+    return {'kind': kind, 'name': name, 'pos': int(pos), 'has_gauss': int(has_gauss),
+            'cached_gaussian': float(cached_gaussian)}, keys
+
+
+def _restore_rng(meta, path):
+    # The generator described by meta; a run on the global np.random state gets that
+    # state restored
+    if meta['kind'] == 'generator':
+        state = meta['state']
+        bit_generator = getattr(np.random, state['bit_generator'])()
+        bit_generator.state = state
+        return np.random.Generator(bit_generator)
+    legacy = (meta['name'], np.load(os.path.join(path, 'rng_keys.npy')), meta['pos'], meta['has_gauss'],
+              meta['cached_gaussian'])
+    if meta['kind'] == 'global':
+        np.random.set_state(legacy)
+        return np.random
+    rng = np.random.RandomState()
+    rng.set_state(legacy)
+    return rng
+
+
+def save_checkpoint(engine, path, round_num, link_from=None):
+    # Write the engine state as it enters round round_num. The directory is built
+    # next to path and swapped in. The previous checkpoint is moved to path.old and
+    # only deleted once the new one is in place; load_checkpoint falls back to
+    # path.old, so a crash mid-save leaves the previous checkpoint loadable.
+    # link_from: an earlier checkpoint of the same run whose static arrays are
+    # hard-linked instead of written again.
+    path = path.rstrip('/\\')
+    tmp = path + '.tmp'
+    if os.path.exists(tmp):
+        shutil.rmtree(tmp)
+    os.makedirs(tmp)
+    for name in STATIC_ARRAYS + STATE_ARRAYS:
+        file = os.path.join(tmp, name + '.npy')
+        if name in STATIC_ARRAYS and link_from is not None:
+            try:
+                os.link(os.path.join(link_from, name + '.npy'), file)
+                continue
+            except OSError:
+                pass
+        np.save(file, getattr(engine, name))
+    rng_meta, rng_keys = _rng_state(engine.rng)
+    if rng_keys is not None:
+        np.save(os.path.join(tmp, 'rng_keys.npy'), rng_keys)
+    nodes = None if engine.nodes == list(range(engine.num_nodes)) else engine.nodes
+    meta = {
+        'version': CHECKPOINT_VERSION,
+        'round': round_num,
+        'num_nodes': engine.num_nodes,
+        'memory_depth': engine.memory_depth,
+        'memory_head': engine.memory_head,
+        'num_flipped': engine.num_flipped,
+        'incremental': engine.incremental,
+        'strategy_names': engine.strategy_names,
+        'payoff_table': engine.table.tolist(),
+        'nodes': nodes,
+        'rng': rng_meta,
+    }
+    with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    old = path + '.old'
+    if os.path.exists(path):
+        if os.path.exists(old):
+            shutil.rmtree(old)
+        os.replace(path, old)
+    os.replace(tmp, path)
+    if os.path.exists(old):
+        shutil.rmtree(old)
+    return path
+
+
+def load_checkpoint(path, rng=None, mmap_mode='c'):
+    # (engine, round_num): the engine is ready to play round round_num.
+    # rng=None restores the saved RNG state; mmap_mode=None reads everything into memory.
+    # If a save was interrupted after moving the previous checkpoint aside, that one
+    # (path.old) is loaded.
+    path = path.rstrip('/\\')
+    old = path + '.old'
+    if not os.path.exists(os.path.join(path, 'meta.json')) and os.path.exists(os.path.join(old, 'meta.json')):
+        path = old
+    with open(os.path.join(path, 'meta.json')) as f:
+        meta = json.load(f)
+    if meta['version'] != CHECKPOINT_VERSION:
+        raise ValueError(f"Unsupported checkpoint version: {meta['version']}")
+    arrays = {}
+    for name in STATIC_ARRAYS + STATE_ARRAYS:
+        mode = 'r' if name in STATIC_ARRAYS and mmap_mode is not None else mmap_mode
+        arrays[name] = np.load(os.path.join(path, name + '.npy'), mmap_mode=mode)
+    table = meta['payoff_table']
+    payoff_matrix = {(a, b): (table[a][b], table[b][a]) for a in (0, 1) for b in (0, 1)}
+    if rng is None:
+        rng = _restore_rng(meta['rng'], path)
+    engine = PDEngine(arrays['indptr'], arrays['indices'], arrays['strategy'], arrays['action'], payoff_matrix,
+                      strategy_names=meta['strategy_names'], nodes=meta['nodes'], rng=rng,
+                      memory_depth=meta['memory_depth'], incremental=meta['incremental'])
+    for name in STATE_ARRAYS:
+        setattr(engine, name, arrays[name])
+    engine.memory_head = meta['memory_head']
+    engine.num_flipped = meta['num_flipped']
+    return engine, meta['round']
+
+
+class CheckpointHook(SimulationHook):
+    # Checkpoint every `every` rounds, after the round's update, so the run resumes at
+    # the next round. With '{round}' in path every checkpoint gets its own directory
+    # (e.g. to branch from several points), sharing the static arrays through hard
+    # links; otherwise path is overwritten each time.
+    def __init__(self, path, every=10):
+        self.path = path
+        self.every = every
+        self.last = None
+
+    def after_round(self, engine, round_num):
+        if (round_num + 1) % self.every == 0:
+            path = self.path.format(round=round_num + 1) if '{round}' in self.path else self.path
+            self.last = save_checkpoint(engine, path, round_num + 1, link_from=self.last)
@@ -0,0 +1,35 @@
+from collections import deque
+
+# Steady-state / limit-cycle detection for deterministic PDEngine runs.
+# The state entering a round (actions, prev_payoffs, triggered flags and neighbour
+# memory) fully determines every later round when no stochastic strategy is in
+# play, so the first repeated state digest marks a fixed point (period 1) or a cycle.
+
+
+class CycleDetector:
+    def __init__(self, max_period=8):
+        self.max_period = max_period
+        self.recent = deque()  # (round_num, digest), at most max_period entries
+        self.seen = {}
+
+    def observe(self, round_num, digest):
+        # Returns (cycle_start_round, period) once a state repeats within max_period
+        if digest in self.seen:
+            start = self.seen[digest]
+            return start, round_num - start
+        self.recent.append((round_num, digest))
+        self.seen[digest] = round_num
+        if len(self.recent) > self.max_period:
+            _, old = self.recent.popleft()
+            del self.seen[old]
+        return None
+
+
+def convergence_info(num_rounds):
+    return {
+        'converged': False,
+        'convergence_round': None,  # first round of the repeating cycle
+        'cycle_length': None,       # 1 for a fixed point
+        'rounds_simulated': num_rounds,
+        'replayed': False,
+    }
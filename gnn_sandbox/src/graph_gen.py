@@ -0,0 +1,214 @@
+import numpy as np
+from src.pd_engine import index_dtype
+
+# Graph generators that build symmetric CSR adjacency (indptr/indices) straight from
+# NumPy arrays with a seeded np.random.Generator: time and memory are linear in the
+# number of edges and no per-node Python objects are created.
+# Self-loops and duplicate edges are never emitted. The graphs follow the same
+# models as their networkx counterparts, but not the same random streams.
+
+
+class CSRGraph:
+    def __init__(self, indptr, indices):
+        self.indptr = indptr
+        self.indices = indices
+        self._nx = None
+
+    @property
+    def num_nodes(self):
+        return len(self.indptr) - 1
+
+    @property
+    def num_edges(self):
+        return len(self.indices) // 2
+
+    @property
+    def degree(self):
+        return np.diff(self.indptr)
+
+    def edge_list(self):
+        # Each undirected edge once, as (u, v) arrays with u < v
+        src = np.repeat(np.arange(self.num_nodes, dtype=self.indices.dtype), self.degree)
+        keep = src < self.indices
+        return src[keep], self.indices[keep]
+
+    def to_networkx(self):
+        # Built on first use (e.g. for plotting) and cached
+        if self._nx is None:
+            import networkx as nx
+            G = nx.Graph()
+            G.add_nodes_from(range(self.num_nodes))
+            G.add_edges_from(zip(*(a.tolist() for a in self.edge_list())))
+            self._nx = G
+        return self._nx
+
+
+def edges_to_csr(num_nodes, u, v):
+    # Symmetric CSR from undirected edges (u[i], v[i]); rows sorted by neighbour id
+    dtype = index_dtype(num_nodes)
+    src = np.concatenate([u, v]).astype(dtype, copy=False)
+    dst = np.concatenate([v, u]).astype(dtype, copy=False)
+    order = np.lexsort((dst, src))
+    indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=num_nodes), out=indptr[1:])
+    return CSRGraph(indptr, dst[order])
+
+
+def _segments(starts, lengths):
+    # Flat indices covering the ranges [starts[i], starts[i] + lengths[i])
+    offsets = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return np.repeat(starts, lengths) + np.arange(int(lengths.sum())) - offsets
+
+
+def _edge_keys(num_nodes, u, v):
+    lo, hi = np.minimum(u, v).astype(np.int64), np.maximum(u, v).astype(np.int64)
+    return lo * num_nodes + hi
+
+
+def _unique_edges(num_nodes, u, v):
+    # Drop self-loops and repeated edges (in either direction)
+    keep = u != v
+    keys = np.unique(_edge_keys(num_nodes, u[keep], v[keep]))
+    return keys // num_nodes, keys % num_nodes
+
+
+def _bernoulli_indices(rng, p, population):
+    # Indices of [0, population) kept independently with probability p, found by
+    # geometric skips between kept indices, so the cost is linear in their number.
+    # Above p = 0.5 the dropped indices are drawn instead.
+    if p <= 0 or population <= 0:
+        return np.empty(0, dtype=np.int64)
+    if p > 0.5:
+        keep = np.ones(population, dtype=bool)
+        keep[_bernoulli_indices(rng, 1 - p, population)] = False
+        return np.flatnonzero(keep)
+    chunks = []
+    last = -1
+    while last < population:
+        draw = int((population - last) * p * 1.05) + 64
+        positions = last + np.cumsum(rng.geometric(p, size=draw))
+        chunks.append(positions[positions < population])
+        last = positions[-1]
+    return np.concatenate(chunks)
+
+
+def _sample_pairs(rng, p, left, right, same_block):
+    # Every pair of left x right linked with probability p; unordered pairs without
+    # self-loops when same_block
+    if not same_block:
+        keys = _bernoulli_indices(rng, p, left * right)
+        return keys // right, keys % right
+    # index i <-> pair (a, b), a < b, with i = b * (b - 1) / 2 + a
+    keys = _bernoulli_indices(rng, p, left * (left - 1) // 2)
+    b = ((1 + np.sqrt(1 + 8 * keys.astype(float))) // 2).astype(np.int64)
+    b -= b * (b - 1) // 2 > keys
+    b += (b + 1) * b // 2 <= keys
+    return keys - b * (b - 1) // 2, b
+
+
+def watts_strogatz_csr(num_nodes, k, p, rng=None):
+    # Ring lattice with k nearest neighbours (k // 2 per side), each edge (u, u + j)
+    # rewired to (u, w) with probability p, like nx.watts_strogatz_graph
+    rng = np.random.default_rng(rng)
+    if k >= num_nodes:
+        raise ValueError(f"k must be smaller than num_nodes, got k={k}, num_nodes={num_nodes}")
+    half = k // 2
+    u = np.tile(np.arange(num_nodes, dtype=np.int64), half)
+    v = (u + np.repeat(np.arange(1, half + 1), num_nodes)) % num_nodes
+    rewired = rng.random(len(u)) < p
+    v[rewired] = rng.integers(0, num_nodes, size=int(rewired.sum()))
+
+    # Redraw rewired edges that became self-loops or duplicates; lattice edges win
+    # over rewired ones
+    for _ in range(100):
+        keys = _edge_keys(num_nodes, u, v)
+        order = np.lexsort((rewired, keys))
+        repeat = np.zeros(len(u), dtype=bool)
+        repeat[order[1:]] = keys[order[1:]] == keys[order[:-1]]
+        bad = (repeat | (u == v)) & rewired
+        if not bad.any():
+            break
+        v[bad] = rng.integers(0, num_nodes, size=int(bad.sum()))
+    u, v = _unique_edges(num_nodes, u, v)
+    return edges_to_csr(num_nodes, u, v)
+
+
+def erdos_renyi_csr(num_nodes, p, rng=None):
+    # G(n, p): every pair linked independently with probability p
+    rng = np.random.default_rng(rng)
+    u, v = _sample_pairs(rng, p, num_nodes, num_nodes, same_block=True)
+    return edges_to_csr(num_nodes, u, v)
+
+
+def barabasi_albert_csr(num_nodes, m, rng=None):
+    # Preferential attachment with the Batagelj-Brandes edge list: every edge takes two
+    # slots, and the target slot of a new edge copies a uniformly drawn slot from before
+    # the new node's first edge, which picks an earlier node with probability
+    # proportional to its degree. Copies of copies are resolved with pointer jumping
+    # instead of a sequential loop. Like nx.barabasi_albert_graph, every new node gets
+    # m distinct targets: repeated targets are redrawn until there are none.
+    rng = np.random.default_rng(rng)
+    if not 1 <= m < num_nodes:
+        raise ValueError(f"m must satisfy 1 <= m < num_nodes, got m={m}, num_nodes={num_nodes}")
+    num_new = (num_nodes - m - 1) * m
+    slots = np.empty(2 * (m + num_new), dtype=np.int64)
+    # Seed star: node 0 linked to 1..m, as in nx.barabasi_albert_graph
+    slots[0:2 * m:2] = 0
+    slots[1:2 * m:2] = np.arange(1, m + 1)
+    slots[2 * m::2] = np.repeat(np.arange(m + 1, num_nodes), m)
+    targets = 2 * m + 2 * np.arange(num_new) + 1
+    limit = 2 * m + 2 * m * (np.arange(num_new) // m)  # first slot of the new node
+    draws = rng.integers(0, limit)
+    is_target = np.zeros(len(slots), dtype=bool)
+    is_target[targets] = True
+    # root: the source or seed slot each slot ends up copying
+    root = np.arange(len(slots))
+    root[targets] = draws
+    while is_target[root[targets]].any():
+        root[targets] = root[root[targets]]
+    # Targets that copied each slot, for following redraws down the copy tree
+    children = np.argsort(draws, kind='stable')
+    parents = draws[children]
+
+    rows = np.arange(num_nodes - m - 1)  # new nodes whose targets may repeat
+    while len(rows):
+        values = slots[root[targets]].reshape(-1, m)[rows]
+        order = np.argsort(values, axis=1, kind='stable')
+        ranked = np.take_along_axis(values, order, axis=1)
+        repeat_row, repeat_col = np.nonzero(ranked[:, 1:] == ranked[:, :-1])
+        if not len(repeat_row):
+            break
+        redraw = rows[repeat_row] * m + order[repeat_row, repeat_col + 1]
+        draws[redraw] = rng.integers(0, limit[redraw])
+        changed = np.zeros(num_new, dtype=bool)
+        stale = redraw
+        while len(stale):
+            # New roots for the redrawn targets and everything that copied them; a
+            # redrawn target whose new source moved later in the wave is redone
+            frontier = stale
+            while len(frontier):
+                root[targets[frontier]] = root[draws[frontier]]
+                changed[frontier] = True
+                lo = np.searchsorted(parents, targets[frontier], side='left')
+                hi = np.searchsorted(parents, targets[frontier], side='right')
+                frontier = np.unique(children[_segments(lo, hi - lo)])
+            stale = redraw[root[targets[redraw]] != root[draws[redraw]]]
+        rows = np.unique(np.flatnonzero(changed) // m)
+    slots[targets] = slots[root[targets]]
+    u, v = _unique_edges(num_nodes, slots[0::2], slots[1::2])
+    return edges_to_csr(num_nodes, u, v)
+
+
+def stochastic_block_model_csr(sizes, probs, rng=None):
+    # Blocks of the given sizes; a pair in blocks (a, b) is linked with probs[a][b]
+    rng = np.random.default_rng(rng)
+    sizes = np.asarray(sizes, dtype=np.int64)
+    probs = np.asarray(probs, dtype=float)
+    offsets = np.concatenate([[0], np.cumsum(sizes)])
+    us, vs = [], []
+    for a in range(len(sizes)):
+        for b in range(a, len(sizes)):
+            u, v = _sample_pairs(rng, probs[a, b], sizes[a], sizes[b], same_block=a == b)
+            us.append(u + offsets[a])
+            vs.append(v + offsets[b])
+    return edges_to_csr(int(offsets[-1]), np.concatenate(us), np.concatenate(vs))
@@ -0,0 +1,96 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+# Observers for the array-backend simulation loop (prisoner_dilemma.run_rounds).
+# A hook subclasses SimulationHook and overrides any of the callbacks; each phase of
+# a round ('play', 'record', 'update') is wrapped in before_phase/after_phase.
+# Without hooks the loop skips all of this, so there is no cost unless one is registered.
+
+PHASES = ('play', 'record', 'update')
+
+
+class SimulationHook:
+    def before_round(self, engine, round_num):
+        pass
+
+    def after_round(self, engine, round_num):
+        pass
+
+    def before_phase(self, engine, round_num, phase):
+        pass
+
+    def after_phase(self, engine, round_num, phase):
+        pass
+
+
+class SimulationMetrics:
+    def __init__(self):
+        self.phase_time = dict.fromkeys(PHASES, 0.0)  # total seconds per phase
+        self.rounds = []           # round numbers (a resumed run starts past 0)
+        self.round_time = []       # seconds per round
+        self.flipped = []          # nodes that changed action in the round's update
+        self.coop_fraction = []    # share of cooperators when the round was played
+        self.payoff_total = []     # sum of payoffs of the round
+
+    @property
+    def num_rounds(self):
+        return len(self.round_time)
+
+    def to_dataframe(self):
+        return pd.DataFrame({
+            'round': self.rounds,
+            'round_time': self.round_time,
+            'flipped': self.flipped,
+            'coop_fraction': self.coop_fraction,
+            'payoff_total': self.payoff_total,
+        })
+
+    def summary(self):
+        total = sum(self.phase_time.values())
+        return {
+            'rounds': self.num_rounds,
+            'total_time': total,
+            'phase_time': dict(self.phase_time),
+            'phase_share': {phase: t / total if total else 0.0 for phase, t in self.phase_time.items()},
+            'rounds_per_s': self.num_rounds / total if total else None,
+            'flipped_total': int(np.sum(self.flipped)),
+        }
+
+
+class MetricsRecorder(SimulationHook):
+    # Per-phase wall time plus per-round flips, cooperation rate and payoff totals.
+    # Counters come from arrays the engine already holds (num_flipped, action, payoff).
+    def __init__(self):
+        self.metrics = SimulationMetrics()
+        self._phase_start = None
+        self._round_start = None
+
+    def before_round(self, engine, round_num):
+        self._round_start = time.perf_counter()
+
+    def before_phase(self, engine, round_num, phase):
+        self._phase_start = time.perf_counter()
+
+    def after_phase(self, engine, round_num, phase):
+        self.metrics.phase_time[phase] = self.metrics.phase_time.get(phase, 0.0) + time.perf_counter() - self._phase_start
+        if phase == 'play':
+            self.metrics.coop_fraction.append(float(np.mean(engine.action)) if engine.num_nodes else 0.0)
+            self.metrics.payoff_total.append(engine.payoff.sum().item())
+        elif phase == 'update':
+            self.metrics.flipped.append(engine.num_flipped)
+
+    def after_round(self, engine, round_num):
+        self.metrics.rounds.append(round_num)
+        self.metrics.round_time.append(time.perf_counter() - self._round_start)
+
+
+class ProgressPrinter(SimulationHook):
+    def __init__(self, every=10):
+        self.every = every
+
+    def after_round(self, engine, round_num):
+        if round_num % self.every == 0:
+            print(f"round {round_num}: coop={np.mean(engine.action):.3f} "
+                  f"payoff={engine.payoff.sum()} flipped={engine.num_flipped}")
@@ -0,0 +1,226 @@
+import hashlib
+
+import numpy as np
+from src.strategies import BATCHED_STRATEGY_FUNCTIONS, READS_NEIGHBOR_UPDATES, STOCHASTIC_STRATEGIES
+from src.strategies import strategy_names as _all_strategy_names
+
+# Array-backed prisoner's dilemma engine.
+# The graph is held as CSR adjacency (indptr/indices) and every node attribute as a
+# NumPy vector, so a round costs a handful of array operations instead of one
+# G.nodes[...] dict lookup per edge.
+# Neighbour order inside each CSR row follows G.neighbors(node), so strategies that
+# look at the "first neighbour" behave exactly like the networkx version.
+# Actions are updated with one batched kernel per strategy group (see strategies.py).
+# Neighbour memory is an int8 array aligned with the CSR edge slots, optionally kept
+# as a ring buffer of the last memory_depth rounds.
+# With incremental=True the engine keeps per-node cooperating-neighbour counts up
+# to date as actions flip and play_round only recomputes the payoffs of flipped
+# nodes and their neighbours (the adjacency must be symmetric, as for any
+# undirected graph). The result is identical to a full recompute. Only payoff
+# accumulation is incremental: update_actions still runs every strategy kernel on
+# all nodes (they read payoffs, memory and the RNG of every node) and rewrites the
+# whole memory row, so a round stays O(E) overall.
+
+
+def graph_to_csr(G):
+    nodes = list(G.nodes)
+    index = {node: i for i, node in enumerate(nodes)}
+    degrees = np.fromiter((len(G.adj[node]) for node in nodes), dtype=np.int64, count=len(nodes))
+    indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+    np.cumsum(degrees, out=indptr[1:])
+    indices = np.fromiter((index[nb] for node in nodes for nb in G.adj[node]),
+                          dtype=index_dtype(len(nodes)), count=int(indptr[-1]))
+    return nodes, indptr, indices
+
+
+def index_dtype(num_nodes):
+    # int32 node ids halve the size of the edge arrays whenever they fit
+    return np.int32 if num_nodes < 2**31 else np.int64
+
+
+def payoff_table(payoff_matrix):
+    # table[a_self, a_other] -> payoff of the node playing a_self
+    return np.array([[payoff_matrix[(a, b)][0] for b in (0, 1)] for a in (0, 1)])
+
+
+class PDEngine:
+    def __init__(self, indptr, indices, strategy_ids, actions, payoff_matrix,
+                 strategy_names=None, nodes=None, rng=None, memory_depth=1, incremental=False):
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.num_nodes = len(self.indptr) - 1
+        self.indices = np.asarray(indices, dtype=index_dtype(self.num_nodes))
+        self.degree = np.diff(self.indptr)
+        self.nodes = list(range(self.num_nodes)) if nodes is None else list(nodes)
+        # Edges whose neighbour comes before the owning node in update order
+        edge_src = np.repeat(np.arange(self.num_nodes, dtype=self.indices.dtype), self.degree)
+        self.earlier_neighbor = self.indices < edge_src
+        self.strategy_names = _all_strategy_names() if strategy_names is None else list(strategy_names)
+        self.rng = np.random if rng is None else rng
+        self.table = payoff_table(payoff_matrix)
+
+        self.strategy = np.asarray(strategy_ids, dtype=np.int16)
+        self.action = np.asarray(actions, dtype=np.int8).copy()
+        self.payoff = np.zeros(self.num_nodes, dtype=self.table.dtype)
+        self.prev_payoff = np.zeros(self.num_nodes, dtype=self.table.dtype)
+        self.triggered = np.zeros(self.num_nodes, dtype=bool)
+        # Actions seen from each neighbour, one slot per CSR edge and one row per
+        # remembered round; memory_head is the row written last.
+        # Unseen neighbours count as cooperators, as with memory.get(neighbor, 1).
+        if memory_depth < 1:
+            raise ValueError(f"memory_depth must be at least 1, got {memory_depth}")
+        self.memory_depth = memory_depth
+        self.memory_history = np.ones((memory_depth, len(self.indices)), dtype=np.int8)
+        self.memory_head = 0
+        self.next_action = self.action.copy()
+
+        self.incremental = incremental
+        self.coop = None      # cached coop_neighbors() for the current actions
+        self.dirty = None     # nodes whose payoff is stale (incremental mode)
+        self.num_flipped = 0  # nodes that changed action in the last update
+
+        # Node indices of each strategy, in index order
+        order = np.argsort(self.strategy, kind='stable')
+        bounds = np.flatnonzero(np.diff(self.strategy[order])) + 1
+        self.groups = [(self.strategy_names[self.strategy[group[0]]], group)
+                       for group in np.split(order, bounds) if len(group)]
+        missing = [name for name, _ in self.groups if name not in BATCHED_STRATEGY_FUNCTIONS]
+        if missing:
+            raise ValueError(f"No batched kernel registered for strategies: {missing}")
+
+    @classmethod
+    def from_graph(cls, G, payoff_matrix, rng=None, memory_depth=1, incremental=False):
+        # Snapshot a graph initialised by initialize_agent_actions
+        nodes, indptr, indices = graph_to_csr(G)
+        names = _all_strategy_names()
+        name_to_id = {name: i for i, name in enumerate(names)}
+        strategy_ids = [name_to_id[str(G.nodes[node]['strategy_type'])] for node in nodes]
+        actions = [G.nodes[node]['current_action'] for node in nodes]
+        engine = cls(indptr, indices, strategy_ids, actions, payoff_matrix,
+                     strategy_names=names, nodes=nodes, rng=rng, memory_depth=memory_depth,
+                     incremental=incremental)
+        memory = engine.memory
+        for i, node in enumerate(nodes):
+            attrs = G.nodes[node]
+            engine.payoff[i] = attrs.get('payoff', 0)
+            engine.prev_payoff[i] = attrs.get('prev_payoff', 0)
+            engine.triggered[i] = attrs.get('triggered', False)
+            start = indptr[i]
+            for offset, nb in enumerate(G.adj[node]):
+                memory[start + offset] = attrs.get('memory', {}).get(nb, 1)
+        return engine
+
+    @property
+    def memory(self):
+        # Most recent action seen from each neighbour
+        return self.memory_history[self.memory_head]
+
+    def memory_at(self, lag):
+        # Actions seen lag rounds before the most recent ones (lag < memory_depth)
+        if not 0 <= lag < self.memory_depth:
+            raise ValueError(f"lag must be in [0, {self.memory_depth}), got {lag}")
+        return self.memory_history[(self.memory_head - lag) % self.memory_depth]
+
+    def coop_neighbors(self):
+        # Per-row sum of neighbour actions via a prefix sum over the edge array
+        if self.coop is None:
+            csum = np.zeros(len(self.indices) + 1, dtype=np.int64)
+            np.cumsum(self.action[self.indices], out=csum[1:])
+            self.coop = csum[self.indptr[1:]] - csum[self.indptr[:-1]]
+        return self.coop
+
+    def invalidate(self):
+        # Call after changing action/payoff arrays from outside the engine
+        self.coop = None
+        self.dirty = None
+
+    def _payoffs(self, nodes=slice(None)):
+        action, coop = self.action[nodes], self.coop_neighbors()[nodes]
+        return self.table[action, 0] * (self.degree[nodes] - coop) + self.table[action, 1] * coop
+
+    def play_round(self):
+        if self.incremental and self.dirty is not None:
+            self.payoff[self.dirty] = self._payoffs(self.dirty)
+        else:
+            self.payoff = self._payoffs()
+        self.dirty = np.empty(0, dtype=np.int64) if self.incremental else None
+        return self.payoff
+
+    def is_deterministic(self):
+        return not any(name in STOCHASTIC_STRATEGIES for name, _ in self.groups)
+
+    def state_digest(self):
+        # Hash of everything the next rounds depend on (payoffs follow from actions)
+        h = hashlib.blake2b(digest_size=16)
+        for array in (self.action, self.prev_payoff, self.triggered):
+            h.update(np.ascontiguousarray(array).data)
+        for lag in range(self.memory_depth):
+            h.update(self.memory_at(lag).data)
+        return h.digest()
+
+    def edge_slots(self, nodes):
+        # (row, slot) pairs for every edge of the given nodes: row is the position in
+        # nodes, slot the CSR edge index
+        nodes = np.asarray(nodes, dtype=np.int64)
+        counts = self.degree[nodes]
+        rows = np.repeat(np.arange(len(nodes)), counts)
+        row_start = np.cumsum(counts) - counts
+        slots = np.arange(int(counts.sum())) - np.repeat(row_start - self.indptr[nodes], counts)
+        return rows, slots
+
+    def update_actions(self):
+        # Reproduces the in-place, node-order update of update_agent_actions: node i
+        # sees the new action of every neighbour j < i (handled by the
+        # READS_NEIGHBOR_UPDATES kernels and by the memory write below).
+        self.next_action = self.action.copy()
+        deferred = []
+        for name, nodes in self.groups:
+            if name in READS_NEIGHBOR_UPDATES:
+                deferred.append((name, nodes))
+            else:
+                self.next_action[nodes] = BATCHED_STRATEGY_FUNCTIONS[name](self, nodes)
+        for name, nodes in deferred:
+            self.next_action[nodes] = BATCHED_STRATEGY_FUNCTIONS[name](self, nodes)
+
+        old_action = self.action
+        self.action = self.next_action
+        self.prev_payoff = self.payoff.copy()
+        flipped = np.flatnonzero(self.action != old_action)
+        self.num_flipped = len(flipped)
+        if self.incremental and self.coop is not None and self.dirty is not None:
+            # Patch the neighbour counts of everyone next to a flipped node
+            rows, slots = self.edge_slots(flipped)
+            nbrs = self.indices[slots]
+            delta = self.action[flipped].astype(np.int64) - old_action[flipped]
+            np.add.at(self.coop, nbrs, delta[rows])
+            self.dirty = np.unique(np.concatenate([self.dirty, flipped, nbrs]))
+        else:
+            self.coop = None
+            self.dirty = None
+        nbrs = self.indices
+        self.memory_head = (self.memory_head + 1) % self.memory_depth
+        self.memory_history[self.memory_head] = np.where(self.earlier_neighbor,
+                                                         self.action[nbrs], old_action[nbrs])
+
+    def node_features(self, round_num, include_memory=False):
+        # Columns of get_node_features. The neighbour memory is only exported with
+        # include_memory, as one int8 array per node (neighbours in CSR order) cut from a
+        # copy of this round's memory; that is one object per node and round, so for
+        # long runs read the edge-aligned engine.memory (or a trace with
+        # include_memory=True) instead.
+        coop = self.coop_neighbors()
+        names = np.asarray(self.strategy_names)
+        features = {
+            'node': self.nodes,
+            'round': np.full(self.num_nodes, round_num),
+            'degree': self.degree,
+            'current_action': self.action.copy(),
+            'strategy_type': names[self.strategy],
+            'payoff': self.payoff.copy(),
+            'triggered': self.triggered.copy(),
+            'prev_payoff': self.prev_payoff.copy(),
+            'coop_neighbors': coop,
+            'defector_neighbors': self.degree - coop
+        }
+        if include_memory:
+            features['memory'] = np.split(self.memory.copy(), self.indptr[1:-1])
+        return features
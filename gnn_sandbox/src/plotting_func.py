@@ -1,8 +1,13 @@
+import os
+import weakref
+
 import matplotlib.pyplot as plt
 import networkx as nx
 import numpy as np
-from collections import defaultdict
 import matplotlib.patches as mpatches
+from matplotlib.animation import FuncAnimation
+from matplotlib.collections import LineCollection
+from matplotlib.colors import ListedColormap
 
 # def visualize_graph(G, current_state, title=""):
 #     color_map = ['green' if current_state[node] == 1 else 'red' for node in G.nodes]
@@ -10,16 +15,217 @@ import matplotlib.patches as mpatches
 #     plt.title(title)
 #     plt.show()
 
-def visualize_graph(G, node_attr, title=""):
-    values = [node_attr[node] for node in G.nodes]
-    unique_values = list(set(values))
-    color_dict = {val: plt.cm.tab10(i) for i, val in enumerate(unique_values)}
-    color_map = [color_dict[val] for val in values]
-    legend_patches = [mpatches.Patch(color=color_dict[val], label=str(val)) for val in unique_values]
+# Graphs can be a networkx graph, a graph_gen.CSRGraph or a PDEngine. Positions are an
+# (num_nodes, 2) array in node order (list(G.nodes) for networkx, which is also the
+# engine's order), computed once per graph and layout and then reused, so every round
+# of an evolution is drawn on the same picture.
+# Edges are drawn as one LineCollection and nodes as one scatter. Past
+# DENSITY_THRESHOLD nodes the graph is rendered as a raster instead: the mean node
+# value per pixel (the most common category for categorical values), no edges.
+
+DENSITY_THRESHOLD = 50_000
+
+_layout_cache = weakref.WeakKeyDictionary()
+
+
+def _to_networkx(G):
+    if isinstance(G, nx.Graph):
+        return G
+    if hasattr(G, 'to_networkx'):
+        return G.to_networkx()
+    from src.graph_gen import CSRGraph
+    return CSRGraph(G.indptr, G.indices).to_networkx()
+
+
+def _num_nodes(G):
+    return G.number_of_nodes() if isinstance(G, nx.Graph) else len(G.indptr) - 1
+
+
+def _edge_arrays(G):
+    # Each undirected edge once as (u, v) node positions
+    if isinstance(G, nx.Graph):
+        index = {node: i for i, node in enumerate(G.nodes)}
+        edges = np.array([(index[u], index[v]) for u, v in G.edges], dtype=np.int64).reshape(-1, 2)
+        return edges[:, 0], edges[:, 1]
+    src = np.repeat(np.arange(len(G.indptr) - 1), np.diff(G.indptr))
+    keep = src < G.indices
+    return src[keep], G.indices[keep]
+
+
+def _compute_layout(G, layout, seed):
+    n = _num_nodes(G)
+    if layout == 'auto':
+        # Force-directed layouts take seconds at a few thousand nodes and the networkx
+        # spectral solver minutes past ~50k; the ring order of circular matches the
+        # Watts-Strogatz lattice the simulations use
+        layout = 'spring' if n <= 1000 else 'spectral' if n <= 20_000 else 'circular'
+    rng = np.random.default_rng(seed)
+    if layout == 'random':
+        return rng.random((n, 2))
+    if layout == 'circular':
+        angle = 2 * np.pi * np.arange(n) / max(n, 1)
+        return np.column_stack([np.cos(angle), np.sin(angle)])
+    H = _to_networkx(G)
+    if layout == 'spring':
+        pos = nx.spring_layout(H, seed=seed)
+    elif layout == 'spectral':
+        pos = nx.spectral_layout(H)
+    elif layout == 'kamada_kawai':
+        pos = nx.kamada_kawai_layout(H)
+    else:
+        raise ValueError(f"Unknown layout: {layout}")
+    return np.array([pos[node] for node in H.nodes], dtype=float).reshape(n, 2)
+
+
+def graph_layout(G, layout='auto', seed=42, path=None):
+    # Node positions, cached per graph object; with path (.npy) they are also
+    # persisted and loaded from disk on later runs. The cache assumes the graph's
+    # nodes and edges are not changed afterwards.
+    key = (layout, seed)
+    cached = _layout_cache.get(G, {})
+    if key in cached:
+        return cached[key]
+    if path is not None and os.path.exists(path):
+        pos = np.load(path)
+    else:
+        pos = _compute_layout(G, layout, seed)
+        if path is not None:
+            np.save(path, pos)
+    if len(pos) != _num_nodes(G):
+        raise ValueError(f"Layout has {len(pos)} positions for {_num_nodes(G)} nodes")
+    _layout_cache.setdefault(G, {})[key] = pos
+    return pos
+
+
+def _node_values(G, node_attr):
+    # Array in node order from an attribute name, a {node: value} dict or an array
+    if isinstance(node_attr, str):
+        return np.array([value for _, value in G.nodes(data=node_attr)])
+    if isinstance(node_attr, dict):
+        return np.array([node_attr[node] for node in G.nodes])
+    return np.asarray(node_attr)
+
+
+def _categories(values, categories=None):
+    # Integer codes, category labels and a tab10-style colormap for categorical values
+    if categories is None:
+        labels, codes = np.unique(values, return_inverse=True)
+    else:
+        labels = np.unique(np.asarray(categories))
+        codes = np.searchsorted(labels, values)
+    cmap = ListedColormap([plt.cm.tab10(i % 10) for i in range(max(len(labels), 1))])
+    return codes, labels, cmap
+
+
+def draw_graph(G, values, pos=None, ax=None, mode='auto', categorical=True, categories=None,
+               node_size=None, edge_alpha=0.2, resolution=512, cmap='coolwarm'):
+    # Draw G coloured by values (one per node) and return (ax, artist); update the
+    # artist with update_colors(artist, new_values) to animate.
+    # mode: 'vector' (LineCollection + scatter), 'density' (raster of the mean value
+    # per pixel, or of the majority category when categorical) or 'auto' (density past
+    # DENSITY_THRESHOLD nodes).
+    # categories fixes the legend when values do not (yet) contain every category.
+    n = _num_nodes(G)
+    pos = graph_layout(G) if pos is None else pos
+    ax = plt.gca() if ax is None else ax
+    if mode == 'auto':
+        mode = 'density' if n > DENSITY_THRESHOLD else 'vector'
+    values = np.asarray(values)
+    labels = None
+    if categorical:
+        values, labels, cmap = _categories(values, categories)
+    vmin, vmax = (0, len(labels) - 1) if labels is not None else (None, None)
+
+    if mode == 'density':
+        extent = [pos[:, 0].min(), pos[:, 0].max(), pos[:, 1].min(), pos[:, 1].max()]
+        bins = _pixel_bins(pos, resolution)
+        num_categories = len(labels) if labels is not None else None
+        artist = ax.imshow(_density_image(values, bins, num_categories), origin='lower', extent=extent,
+                           cmap=cmap, vmin=vmin, vmax=vmax, interpolation='nearest', aspect='auto')
+        artist.density_bins = bins
+    elif mode == 'vector':
+        u, v = _edge_arrays(G)
+        ax.add_collection(LineCollection(np.stack([pos[u], pos[v]], axis=1), colors='gray',
+                                         linewidths=0.5, alpha=edge_alpha, zorder=1))
+        size = node_size if node_size is not None else max(2.0, 300.0 / np.sqrt(max(n, 1)))
+        artist = ax.scatter(pos[:, 0], pos[:, 1], c=values, s=size, cmap=cmap, vmin=vmin, vmax=vmax,
+                            zorder=2, rasterized=n > 5000)
+        ax.autoscale_view()
+    else:
+        raise ValueError(f"Unknown mode: {mode}")
+    artist.categories = labels
+    ax.set_axis_off()
+    if labels is not None:
+        colors = artist.get_cmap()
+        ax.legend(handles=[mpatches.Patch(color=colors(i), label=str(label)) for i, label in enumerate(labels)],
+                  loc='best', fontsize='small')
+    return ax, artist
+
+
+def _pixel_bins(pos, resolution):
+    # Pixel index of every node, computed once per layout
+    lo, hi = pos.min(axis=0), pos.max(axis=0)
+    cells = np.clip(((pos - lo) / np.where(hi > lo, hi - lo, 1) * resolution).astype(np.int64), 0, resolution - 1)
+    return cells[:, 1] * resolution + cells[:, 0], resolution
+
+
+def _density_image(values, bins, num_categories=None):
+    # Mean value per pixel; with num_categories, values are category codes and each
+    # pixel shows its most common one (ties go to the lower code)
+    pixel, resolution = bins
+    counts = np.bincount(pixel, minlength=resolution * resolution)
+    if num_categories is not None:
+        votes = np.bincount(pixel * num_categories + values, minlength=resolution * resolution * num_categories)
+        image = votes.reshape(-1, num_categories).argmax(axis=1)
+        return np.ma.masked_array(image, mask=counts == 0).reshape(resolution, resolution)
+    sums = np.bincount(pixel, weights=values, minlength=resolution * resolution)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        image = sums / counts
+    return np.ma.masked_invalid(image).reshape(resolution, resolution)
+
+
+def update_colors(artist, values):
+    # Recolour an artist from draw_graph without touching positions or edges
+    values = np.asarray(values)
+    if artist.categories is not None:
+        values = np.searchsorted(artist.categories, values)
+    if hasattr(artist, 'density_bins'):
+        num_categories = len(artist.categories) if artist.categories is not None else None
+        artist.set_data(_density_image(values, artist.density_bins, num_categories))
+    else:
+        artist.set_array(values)
+    return artist
+
+
+def animate_graph(G, frames, pos=None, interval=200, mode='auto', categorical=True, categories=None,
+                  title="Round {round}", **draw_kwargs):
+    # Animation of node values over rounds: frames is a (num_rounds, num_nodes) array
+    # (e.g. run_simulation(...)['current_action'].values.reshape(-1, num_nodes), or the
+    # same column of a trace) or a sequence of per-round arrays. Layout and edges are
+    # drawn once; each frame only recolours the nodes.
+    fig, ax = plt.subplots(figsize=(6, 6))
+    ax, artist = draw_graph(G, frames[0], pos=pos, ax=ax, mode=mode, categorical=categorical,
+                            categories=categories, **draw_kwargs)
+    heading = ax.set_title(title.format(round=0))
+
+    def update(round_num):
+        update_colors(artist, frames[round_num])
+        heading.set_text(title.format(round=round_num))
+        return artist, heading
+
+    return FuncAnimation(fig, update, frames=len(frames), interval=interval, blit=False)
+
+
+def visualize_graph(G, node_attr, title="", pos=None, mode='auto'):
+    # node_attr: {node: value} dict, attribute name or array in node order
+    values = _node_values(G, node_attr) if isinstance(G, nx.Graph) else np.asarray(node_attr)
     plt.figure(figsize=(5, 5))
-    nx.draw(G, node_color=color_map, with_labels=True)
+    ax, _ = draw_graph(G, values, pos=pos, mode=mode)
+    if isinstance(G, nx.Graph) and G.number_of_nodes() <= 100:
+        layout = graph_layout(G) if pos is None else pos
+        for i, node in enumerate(G.nodes):
+            ax.annotate(str(node), layout[i], ha='center', va='center', fontsize=7)
     plt.title(title)
-    plt.legend(handles=legend_patches, loc='best', fontsize='small')
     plt.show()
 
 
@@ -35,18 +241,25 @@ def plot_node_attribute_dist(nodes, attribute_name, title="Attribute Distributio
     plt.title(title)
     plt.show()
 
-def plot_node_attribute_grouped_dist(G, group_by, value_attr, title="Distribution", xlabel=None, ylabel=None, bins=10):
-    groups = defaultdict(list)
-    for node in G.nodes:
-        group_value = G.nodes[node][group_by]
-        value = G.nodes[node][value_attr]
-        groups[group_value].append(value)
+def plot_node_attribute_grouped_dist(G, group_by, value_attr, title="Distribution", xlabel=None, ylabel=None,
+                                     bins=10, group_labels=None):
+    # group_by / value_attr: node attribute names of G, or arrays in node order (e.g.
+    # engine.strategy and engine.payoff, with group_labels=engine.strategy_names; G
+    # may then be None). All groups share the same bin edges.
+    groups = _node_values(G, group_by)
+    values = _node_values(G, value_attr).astype(float)
+    uniques, codes = np.unique(groups, return_inverse=True)
+    edges = np.histogram_bin_edges(values, bins=bins)
+    group_name = group_by if isinstance(group_by, str) else "group"
 
     plt.figure(figsize=(6, 3))
-    for label, values in groups.items():
-        plt.hist(values, bins=bins, alpha=0.6, label=f"{group_by}: {label}", edgecolor='black')
-    
-    plt.xlabel(xlabel or value_attr)
+    for i, label in enumerate(uniques):
+        if group_labels is not None:
+            label = group_labels[label]
+        counts, _ = np.histogram(values[codes == i], bins=edges)
+        plt.stairs(counts, edges, fill=True, alpha=0.6, label=f"{group_name}: {label}", edgecolor='black')
+
+    plt.xlabel(xlabel or (value_attr if isinstance(value_attr, str) else "value"))
     plt.ylabel(ylabel or "Frequency")
     plt.title(title)
     plt.legend()
@@ -55,19 +268,24 @@ def plot_node_attribute_grouped_dist(G, group_by, value_attr, title="Distributio
     plt.show()
 
 
-def plot_node_scatter(G, x_attr, y_attr, color_attr='current_action', 
+def plot_node_scatter(G, x_attr, y_attr, color_attr='current_action',
                       title="Scatter Plot", xlabel=None, ylabel=None):
-    x = [G.nodes[node][x_attr] for node in G.nodes]
-    y = [G.nodes[node][y_attr] for node in G.nodes]
-    colors = [G.nodes[node][color_attr] for node in G.nodes]
+    # Attributes are names of G's node attributes or arrays in node order (G may then be
+    # None). Points are left uncoloured with color_attr=None, or when it is a name and
+    # there is no graph to read it from.
+    x = _node_values(G, x_attr)
+    y = _node_values(G, y_attr)
+    has_colors = color_attr is not None and (G is not None or not isinstance(color_attr, str))
+    colors = _node_values(G, color_attr) if has_colors else None
 
     plt.figure(figsize=(5, 3))
-    scatter = plt.scatter(x, y, c=colors, cmap='coolwarm', alpha=0.8)
-    plt.xlabel(xlabel or x_attr)
-    plt.ylabel(ylabel or y_attr)
+    scatter = plt.scatter(x, y, c=colors, cmap='coolwarm' if has_colors else None, alpha=0.8,
+                          rasterized=len(x) > 5000, s=None if len(x) <= 5000 else 2)
+    plt.xlabel(xlabel or (x_attr if isinstance(x_attr, str) else "x"))
+    plt.ylabel(ylabel or (y_attr if isinstance(y_attr, str) else "y"))
     plt.title(title)
-    plt.colorbar(scatter, label=color_attr)
+    if has_colors:
+        plt.colorbar(scatter, label=color_attr if isinstance(color_attr, str) else "value")
     plt.grid(True, linestyle='--', alpha=0.5)
     plt.tight_layout()
     plt.show()
-
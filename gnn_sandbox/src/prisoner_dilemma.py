@@ -2,10 +2,16 @@ import networkx as nx
 import numpy as np
 import matplotlib.pyplot as plt
 import pandas as pd
+from collections import deque
 from src.strategies import *
+from src.pd_engine import PDEngine
+from src.trace import TraceWriter, iter_round_batches, round_batch
+from src.convergence import CycleDetector, convergence_info
+from src.checkpoint import CheckpointHook, load_checkpoint
+from src.temporal_dataset import DEFAULT_FEATURES, export_temporal_dataset
 
-def generate_graph(num_nodes=20, k=4, p=0.3):
-    G = nx.watts_strogatz_graph(n=num_nodes, k=k, p=p)
+def generate_graph(num_nodes=20, k=4, p=0.3, seed=None):
+    G = nx.watts_strogatz_graph(n=num_nodes, k=k, p=p, seed=seed)
     return G
 
 
@@ -14,42 +20,39 @@ def initialize_actions(G, random_init=True): #all nodes randomly initialized if
         G.nodes[node]['current_action'] = np.random.choice([0, 1]) if random_init else 1
 
 
-def agent_strategy(G, config=None):
+def assign_strategies(total_nodes, config=None, rng=None):
+    rng = np.random if rng is None else rng
     strategy_types = list(STRATEGY_FUNCTIONS.keys())
-    nodes = list(G.nodes)
-    total_nodes = len(nodes)
     if config:
-        strategy_counts = []
-        assigned_nodes = 0
-        for strategy in config:
-            count = int(config[strategy] * total_nodes)
-            strategy_counts.append((strategy, count))
-            assigned_nodes += count
-        remaining_nodes = total_nodes - assigned_nodes
+        counts = [int(config[strategy] * total_nodes) for strategy in config]
+        remaining_nodes = total_nodes - sum(counts)
         # If there are remaining nodes, assign them randomly
-        remaining_strategies = np.random.choice(strategy_types, size=remaining_nodes)
-
-        strategy_assignment = []
-        for strategy, count in strategy_counts:
-            strategy_assignment.extend([strategy] * count)
-        strategy_assignment.extend(remaining_strategies)
-        
+        remaining_strategies = rng.choice(strategy_types, size=remaining_nodes)
+        strategy_assignment = np.concatenate([np.repeat(list(config), counts), remaining_strategies])
         # Shuffle the assignments
-        strategy_assignment = np.array(strategy_assignment)
-        np.random.shuffle(strategy_assignment)
+        rng.shuffle(strategy_assignment)
     else:
         # Assign all nodes randomly
-        strategy_assignment = np.random.choice(strategy_types, size=total_nodes)
+        strategy_assignment = rng.choice(strategy_types, size=total_nodes)
     return strategy_assignment
 
 
-def initialize_agent_actions(G, config=None, random_init=True):
-    strategy_assignment = agent_strategy(G, config)
+def agent_strategy(G, config=None, rng=None):
+    return assign_strategies(G.number_of_nodes(), config, rng)
+
+
+def initialize_agent_actions(G, config=None, random_init=True, rng=None):
+    # rng: np.random.Generator, defaults to the global np.random state. A given rng is
+    # kept in G.graph['rng'] for the stochastic strategies of later rounds.
+    if rng is not None:
+        G.graph['rng'] = rng
+    rng = np.random if rng is None else rng
+    strategy_assignment = agent_strategy(G, config, rng=rng)
     nodes = list(G.nodes)
     # Assign strategies and initialize other attributes
     for node, strategy in zip(nodes, strategy_assignment):
         G.nodes[node]['strategy_type'] = strategy
-        G.nodes[node]['current_action'] = np.random.choice([0, 1]) if random_init else 1
+        G.nodes[node]['current_action'] = rng.choice([0, 1]) if random_init else 1
         G.nodes[node]['memory'] = {}
         G.nodes[node]['triggered'] = False
         G.nodes[node]['payoff'] = 0
@@ -101,7 +104,7 @@ def get_node_features(G, node, round_num):
     strategy_type = G.nodes[node]['strategy_type']
     payoffs = G.nodes[node]['payoff']
     prev_payoff = G.nodes[node]['prev_payoff']
-    memory = G.nodes[node]['memory']
+    memory = dict(G.nodes[node]['memory'])  # snapshot, the node's dict keeps changing
     triggered = G.nodes[node]['triggered']
     neighbors = list(G.neighbors(node))
     neighbor_actions = [G.nodes[neighbor]['current_action'] for neighbor in neighbors]
@@ -124,10 +127,175 @@ def get_node_features(G, node, round_num):
     }
 
 
-def run_simulation(num_rounds=10, num_nodes=50, average_connection=6, rewiring=0.3):
-    G = generate_graph(num_nodes=num_nodes, k=average_connection, p=rewiring)
+def build_engine(G, rng=None, memory_depth=1, incremental=False):
+    # Array-backed copy of an initialized graph (see pd_engine.py)
+    return PDEngine.from_graph(G, payoff_matrix, rng=rng, memory_depth=memory_depth,
+                               incremental=incremental)
+
+
+def engine_from_csr(graph, strategy_config=None, rng=None, memory_depth=1, incremental=False,
+                    random_init=True):
+    # Engine straight from a CSRGraph (see graph_gen.py), without building networkx nodes
+    state_rng = np.random if rng is None else rng
+    names = strategy_names()
+    assignment = assign_strategies(graph.num_nodes, strategy_config, state_rng)
+    assigned, inverse = np.unique(assignment, return_inverse=True)
+    strategy_ids = np.array([names.index(name) for name in assigned], dtype=np.int16)[inverse]
+    if random_init:
+        actions = state_rng.choice([0, 1], size=graph.num_nodes)
+    else:
+        actions = np.ones(graph.num_nodes, dtype=np.int8)
+    return PDEngine(graph.indptr, graph.indices, strategy_ids, actions, payoff_matrix,
+                    strategy_names=names, rng=rng, memory_depth=memory_depth, incremental=incremental)
+
+
+def setup_engine(num_nodes=50, average_connection=6, rewiring=0.3, memory_depth=1,
+                 strategy_config=None, rng=None, incremental=False, graph=None):
+    # graph: optional CSRGraph to play on instead of a fresh networkx Watts-Strogatz graph
+    if graph is not None:
+        return engine_from_csr(graph, strategy_config, rng, memory_depth, incremental)
+    G = generate_graph(num_nodes=num_nodes, k=average_connection, p=rewiring, seed=rng)
+    initialize_agent_actions(G, config=strategy_config, random_init=True, rng=rng)
+    return build_engine(G, rng=rng, memory_depth=memory_depth, incremental=incremental)
+
+
+def stream_simulation(num_rounds=10, num_nodes=50, average_connection=6, rewiring=0.3,
+                      memory_depth=1, strategy_config=None, rng=None, incremental=False, graph=None):
+    # Array backend as a generator of per-round columnar batches (see trace.py)
+    engine = setup_engine(num_nodes, average_connection, rewiring, memory_depth, strategy_config, rng,
+                          incremental, graph)
+    yield from iter_round_batches(engine, num_rounds)
+
+
+def export_simulation_dataset(num_rounds=10, num_nodes=50, average_connection=6, rewiring=0.3,
+                              memory_depth=1, strategy_config=None, rng=None, incremental=False,
+                              graph=None, features=DEFAULT_FEATURES, path=None):
+    # Run the array backend straight into a PyG temporal dataset (see temporal_dataset.py);
+    # with path the arrays are written as memory-mapped .npy files there
+    engine = setup_engine(num_nodes, average_connection, rewiring, memory_depth, strategy_config, rng,
+                          incremental, graph)
+    return export_temporal_dataset(engine, num_rounds, features=features, path=path)
+
+
+def run_rounds(engine, num_rounds, record, detect_cycles=False, max_period=8, on_cycle='stop', hooks=None,
+               start_round=0):
+    # Array backend loop: play -> record(round_num, None) -> update.
+    # With detect_cycles, a deterministic run that revisits a state stops early
+    # (on_cycle='stop') or keeps emitting rounds by replaying the cycle
+    # (on_cycle='replay', calling record(round_num, source_round) with an earlier
+    # round whose output is identical). Returns convergence metadata.
+    # hooks: SimulationHook observers (see hooks.py), called around every round and phase.
+    # start_round: first round to play, for an engine resumed from a checkpoint.
+    if on_cycle not in ('stop', 'replay'):
+        raise ValueError(f"on_cycle must be 'stop' or 'replay', got {on_cycle}")
+    hooks = list(hooks or ())
+    info = convergence_info(num_rounds)
+    detector = CycleDetector(max_period) if detect_cycles and engine.is_deterministic() else None
+    if detector is not None:
+        detector.observe(start_round, engine.state_digest())
+    for round_num in range(start_round, num_rounds):
+        if hooks:
+            run_hooked_round(engine, round_num, record, hooks)
+        else:
+            engine.play_round()
+            record(round_num, None)
+            engine.update_actions()
+        cycle = detector.observe(round_num + 1, engine.state_digest()) if detector is not None else None
+        if cycle is not None:
+            start, period = cycle
+            info.update(converged=True, convergence_round=start, cycle_length=period,
+                        rounds_simulated=round_num + 1)
+            if on_cycle == 'replay':
+                for replay_round in range(round_num + 1, num_rounds):
+                    record(replay_round, start + (replay_round - start) % period)
+                info['replayed'] = True
+            break
+    return info
+
+
+def run_hooked_round(engine, round_num, record, hooks):
+    for hook in hooks:
+        hook.before_round(engine, round_num)
+    for phase, step in (('play', engine.play_round),
+                        ('record', lambda: record(round_num, None)),
+                        ('update', engine.update_actions)):
+        for hook in hooks:
+            hook.before_phase(engine, round_num, phase)
+        step()
+        for hook in hooks:
+            hook.after_phase(engine, round_num, phase)
+    for hook in hooks:
+        hook.after_round(engine, round_num)
+
+
+def run_simulation(num_rounds=10, num_nodes=50, average_connection=6, rewiring=0.3, backend='networkx',
+                   memory_depth=1, strategy_config=None, rng=None, incremental=False,
+                   trace_path=None, trace_format='npy', chunk_rounds=16,
+                   detect_cycles=False, max_period=8, on_cycle='stop', graph=None, hooks=None,
+                   checkpoint_path=None, checkpoint_every=10, resume_from=None, include_memory=False):
+    # rng: np.random.Generator used for the graph, the initial state and (array backend)
+    # the stochastic strategies; None keeps the global random state.
+    # trace_path (array backend): stream the trace to disk in chunks and return the path
+    # instead of a DataFrame; read it back with load_trace.
+    # incremental (array backend): only recompute payoffs around nodes that flipped
+    # (action updates and the memory write still cover every node).
+    # detect_cycles (array backend): stop or replay once the state repeats, see run_rounds.
+    # The convergence metadata ends up in df.attrs['convergence'] or the trace's meta.json.
+    # graph (array backend): a CSRGraph from graph_gen.py to play on.
+    # hooks (array backend): SimulationHook observers, e.g. hooks.MetricsRecorder().
+    # checkpoint_path (array backend): save the full state every checkpoint_every rounds
+    # (see checkpoint.py). resume_from: a checkpoint to continue from instead of a new
+    # graph; the run then covers its remaining rounds up to num_rounds, and a given rng
+    # replaces the saved one (to branch off a different continuation).
+    # include_memory (array backend, DataFrame output): add the per-node 'memory' column
+    # (one int8 array per node and round, see PDEngine.node_features).
+    if backend not in ('networkx', 'array'):
+        raise ValueError(f"Unknown backend: {backend}")
+    checkpointing = checkpoint_path is not None or resume_from is not None
+    if backend != 'array' and (trace_path is not None or detect_cycles or graph is not None or hooks
+                               or checkpointing):
+        raise ValueError("trace_path, detect_cycles, graph, hooks and checkpoints need backend='array'")
+    hooks = list(hooks or ())
+    if checkpoint_path is not None:
+        hooks.append(CheckpointHook(checkpoint_path, checkpoint_every))
+    start_round = 0
+    if resume_from is not None:
+        engine, start_round = load_checkpoint(resume_from, rng=rng)
+        if start_round >= num_rounds:
+            raise ValueError(f"Checkpoint {resume_from} is at round {start_round}, num_rounds must be larger")
+    elif backend == 'array':
+        engine = setup_engine(num_nodes, average_connection, rewiring, memory_depth, strategy_config, rng,
+                              incremental, graph)
+    if trace_path is not None:
+        # Last batches, enough to replay any cycle; copies are only kept when a replay can happen
+        recent = deque(maxlen=max_period) if detect_cycles and on_cycle == 'replay' else None
+        with TraceWriter(trace_path, engine, chunk_rounds=chunk_rounds, fmt=trace_format) as writer:
+            def record(round_num, source_round):
+                if source_round is None:
+                    batch = round_batch(engine, round_num)
+                    if recent is not None:
+                        recent.append((round_num, {name: np.array(col) for name, col in batch.items()}))
+                else:
+                    batch = dict(next(b for r, b in recent if r == source_round))
+                    batch['round'] = np.full(engine.num_nodes, round_num, dtype=np.int32)
+                writer.write_batch(batch)
+            writer.meta['convergence'] = run_rounds(engine, num_rounds, record, detect_cycles,
+                                                    max_period, on_cycle, hooks, start_round)
+        return trace_path
+    if backend == 'array':
+        frames = []
+        def record(round_num, source_round):
+            if source_round is None:
+                frames.append(pd.DataFrame(engine.node_features(round_num, include_memory)))
+            else:
+                frames.append(frames[source_round - start_round].assign(round=round_num))
+        info = run_rounds(engine, num_rounds, record, detect_cycles, max_period, on_cycle, hooks, start_round)
+        df = pd.concat(frames, ignore_index=True)
+        df.attrs['convergence'] = info
+        return df
+    G = generate_graph(num_nodes=num_nodes, k=average_connection, p=rewiring, seed=rng)
     # initialize_actions(G, random=False)
-    initialize_agent_actions(G, random_init=True) #config=load_config(), 
+    initialize_agent_actions(G, config=strategy_config, random_init=True, rng=rng) #config=load_config(), 
     all_data = []
     for round_num in range(num_rounds): # In every round
         # Calculate payoffs
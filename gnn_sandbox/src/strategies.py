@@ -1,5 +1,12 @@
 import numpy as np
 
+
+def _rng(G):
+    # Random source of a graph's run: G.graph['rng'] (set by run_simulation when given
+    # an rng), else the global np.random state
+    return G.graph.get('rng', np.random)
+
+
 # Strategy: Always Cooperate
 # This strategy always cooperates, regardless of the actions of others.
 def always_cooperate(node, G, neighbors):
@@ -44,7 +51,7 @@ def pavlov(node, G, neighbors):
 
 # Strategy: Prober
 def prober(node, G, neighbors):
-    if np.random.rand() < 0.1:  # 10% chance to defect
+    if _rng(G).random() < 0.1:  # 10% chance to defect
         return 0
     return G.nodes[node]['memory'].get(neighbors[0], 1) if neighbors else 1
 
@@ -52,13 +59,13 @@ def prober(node, G, neighbors):
 def generous_tft(node, G, neighbors):
     if not neighbors:
         return 1
-    if np.random.rand() > 0.3:  # 70% chance to copy neighbor's last move
+    if _rng(G).random() > 0.3:  # 70% chance to copy neighbor's last move
         return G.nodes[node]['memory'].get(neighbors[0], 1)
     return 1  # Forgive
 
 # Strategy: Random
 def random_strategy(node, G, neighbors):
-    return np.random.choice([0, 1])
+    return _rng(G).choice([0, 1])
 
 # Strategy: Zero-Determinant Extortionate (ZD Extortion)
 def zd_extortion(node, G, neighbors):
@@ -91,4 +98,154 @@ STRATEGY_FUNCTIONS = {
     'Random': random_strategy,
     'ZD_Extortion': zd_extortion,
     'Imitator': imitator
-}
\ No newline at end of file
+}
+
+# Batched strategies
+# Each kernel computes the next action for every node of one strategy at once.
+# Kernels take (engine, nodes), where engine is a PDEngine (see pd_engine.py) and
+# nodes is an array of node indices, and return an array of actions for those nodes.
+# They read the state from before this round's update; kernels listed in
+# READS_NEIGHBOR_UPDATES run last and may also read engine.next_action, which holds
+# the new action of every node handled by the other kernels.
+
+def _first_neighbor_memory(engine, nodes):
+    # Remembered action of the first neighbour, 1 for isolated nodes
+    has_nbrs = engine.degree[nodes] > 0
+    remembered = np.ones(len(nodes), dtype=np.int8)
+    remembered[has_nbrs] = engine.memory[engine.indptr[nodes[has_nbrs]]]
+    return remembered
+
+
+def _defections_seen(engine, nodes):
+    rows, slots = engine.edge_slots(nodes)
+    return np.bincount(rows, weights=engine.memory[slots] == 0, minlength=len(nodes))
+
+
+def always_cooperate_batched(engine, nodes):
+    return np.ones(len(nodes), dtype=np.int8)
+
+
+def always_defect_batched(engine, nodes):
+    return np.zeros(len(nodes), dtype=np.int8)
+
+
+def tit_for_tat_batched(engine, nodes):
+    return _first_neighbor_memory(engine, nodes)
+
+
+def tit_for_two_tats_batched(engine, nodes):
+    if engine.memory_depth < 2:
+        return np.where(_defections_seen(engine, nodes) >= 2, 0, 1)
+    # With two rounds of memory: defect only on a neighbour that defected twice in a row
+    rows, slots = engine.edge_slots(nodes)
+    twice = (engine.memory_at(0)[slots] == 0) & (engine.memory_at(1)[slots] == 0)
+    return np.where(np.bincount(rows, weights=twice, minlength=len(nodes)) > 0, 0, 1)
+
+
+def grim_trigger_batched(engine, nodes):
+    triggered = engine.triggered[nodes] | (_defections_seen(engine, nodes) > 0)
+    engine.triggered[nodes] = triggered
+    return np.where(triggered, 0, 1)
+
+
+def pavlov_batched(engine, nodes):
+    action = engine.action[nodes]
+    return np.where(engine.prev_payoff[nodes] >= 3, action, 1 - action)
+
+
+def prober_batched(engine, nodes):
+    probe = engine.rng.random(len(nodes)) < 0.1
+    return np.where(probe, 0, _first_neighbor_memory(engine, nodes))
+
+
+def generous_tft_batched(engine, nodes):
+    copy = engine.rng.random(len(nodes)) > 0.3
+    return np.where(copy, _first_neighbor_memory(engine, nodes), 1)
+
+
+def random_strategy_batched(engine, nodes):
+    return engine.rng.choice([0, 1], size=len(nodes))
+
+
+def zd_extortion_batched(engine, nodes):
+    cooperate = (_first_neighbor_memory(engine, nodes) == 1) & (engine.prev_payoff[nodes] >= 3)
+    return np.where(cooperate | (engine.degree[nodes] == 0), 1, 0)
+
+
+def imitator_batched(engine, nodes):
+    # Copy the neighbour with the highest prev_payoff (first one on ties).
+    # Nodes are updated in index order, so neighbours with a lower index have already
+    # moved on to this round's payoff and action.
+    rows, slots = engine.edge_slots(nodes)
+    nbrs = engine.indices[slots]
+    updated = nbrs < nodes[rows]
+    prev = np.where(updated, engine.payoff[nbrs], engine.prev_payoff[nbrs])
+    order = np.lexsort((slots, -prev, rows))
+    rows_sorted = rows[order]
+    first = np.flatnonzero(np.r_[True, rows_sorted[1:] != rows_sorted[:-1]]) if len(order) else order
+    best = np.full(len(nodes), -1, dtype=np.int64)
+    best[rows_sorted[first]] = nbrs[order[first]]
+
+    has_best = best >= 0
+    safe_best = np.where(has_best, best, 0)
+    before = has_best & (safe_best < nodes)
+    value = np.where(before, engine.next_action[safe_best], engine.action[safe_best])
+    value = np.where(has_best, value, engine.action[nodes])
+
+    # An imitator copying an earlier imitator ends up with whatever that one copied:
+    # follow those chains down to their first link with pointer jumping.
+    local = np.full(engine.num_nodes, -1, dtype=np.int64)
+    local[nodes] = np.arange(len(nodes))
+    parent = np.arange(len(nodes))
+    chained = before & (local[safe_best] >= 0)
+    parent[chained] = local[safe_best[chained]]
+    while True:
+        grand = parent[parent]
+        if np.array_equal(grand, parent):
+            break
+        parent = grand
+    return value[parent]
+
+
+BATCHED_STRATEGY_FUNCTIONS = {
+    'Always_C': always_cooperate_batched,
+    'Always_D': always_defect_batched,
+    'TFT': tit_for_tat_batched,
+    'TFTT': tit_for_two_tats_batched,
+    'Grim': grim_trigger_batched,
+    'Pavlov': pavlov_batched,
+    'Prober': prober_batched,
+    'GTFT': generous_tft_batched,
+    'Random': random_strategy_batched,
+    'ZD_Extortion': zd_extortion_batched,
+    'Imitator': imitator_batched
+}
+
+READS_NEIGHBOR_UPDATES = {'Imitator'}
+
+# Strategies that draw random numbers (runs using them never settle into a cycle)
+STOCHASTIC_STRATEGIES = {'Prober', 'GTFT', 'Random'}
+
+
+def register_strategy(name, func=None, batched=None, reads_neighbor_updates=False, stochastic=False):
+    # Add or replace a strategy. func is the per-node form used with networkx graphs,
+    # batched the array form used by PDEngine; either may be omitted.
+    if func is None and batched is None:
+        raise ValueError(f"Strategy '{name}' needs a per-node or a batched function")
+    if stochastic:
+        STOCHASTIC_STRATEGIES.add(name)
+    else:
+        STOCHASTIC_STRATEGIES.discard(name)
+    if func is not None:
+        STRATEGY_FUNCTIONS[name] = func
+    if batched is not None:
+        BATCHED_STRATEGY_FUNCTIONS[name] = batched
+        if reads_neighbor_updates:
+            READS_NEIGHBOR_UPDATES.add(name)
+        else:
+            READS_NEIGHBOR_UPDATES.discard(name)
+
+
+def strategy_names():
+    # Every registered strategy, per-node ones first (the order used for strategy ids)
+    return list(dict.fromkeys(list(STRATEGY_FUNCTIONS) + list(BATCHED_STRATEGY_FUNCTIONS)))
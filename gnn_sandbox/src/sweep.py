@@ -0,0 +1,75 @@
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from src.prisoner_dilemma import run_simulation
+
+# Parallel ensembles / parameter sweeps over run_simulation.
+# Every replicate gets its own np.random.Generator built from
+# SeedSequence(root_seed, spawn_key=(grid_index, replicate)), so results don't depend
+# on worker count or scheduling, and any single replicate can be rerun on its own
+# with run_replicate.
+
+SWEEP_PARAMS = ('num_rounds', 'num_nodes', 'average_connection', 'rewiring', 'strategy_config')
+
+
+def parameter_grid(**axes):
+    # parameter_grid(num_nodes=[100, 1000], rewiring=[0.1, 0.3]) -> list of param dicts
+    names = list(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*axes.values())]
+
+
+def param_key(params):
+    # Hashable key for a param dict, e.g. strategy mixes become sorted item tuples
+    def freeze(value):
+        if isinstance(value, dict):
+            return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+        if isinstance(value, (list, tuple)):
+            return tuple(freeze(v) for v in value)
+        return value
+    return tuple((name, freeze(params[name])) for name in sorted(params))
+
+
+def replicate_rng(root_seed, grid_index, replicate):
+    seed_seq = np.random.SeedSequence(root_seed, spawn_key=(grid_index, replicate))
+    return np.random.default_rng(seed_seq)
+
+
+def run_replicate(params, root_seed, grid_index, replicate, summarize=None, backend='array', **sim_kwargs):
+    unknown = set(params) - set(SWEEP_PARAMS)
+    if unknown:
+        raise ValueError(f"Unknown sweep parameters: {sorted(unknown)}")
+    rng = replicate_rng(root_seed, grid_index, replicate)
+    result = run_simulation(**params, **sim_kwargs, backend=backend, rng=rng)
+    return summarize(result) if summarize is not None else result
+
+
+def _run_task(task):
+    return run_replicate(*task[:5], **task[5])
+
+
+def run_sweep(grid, num_replicates=1, root_seed=0, max_workers=None, summarize=None,
+              backend='array', **sim_kwargs):
+    # Run every param dict in grid num_replicates times across a process pool.
+    # Returns {param_key(params): [result of replicate 0, 1, ...]}.
+    # summarize (a module-level function, so it can be pickled) reduces each
+    # simulation DataFrame inside the worker, which keeps inter-process traffic small.
+    # max_workers=0 runs everything in this process.
+    # Same defaults as run_replicate, so any replicate can be rerun on its own
+    sim_kwargs['backend'] = backend
+    tasks = [(params, root_seed, grid_index, replicate, summarize, sim_kwargs)
+             for grid_index, params in enumerate(grid)
+             for replicate in range(num_replicates)]
+    if max_workers == 0:
+        outputs = list(map(_run_task, tasks))
+    else:
+        workers = max_workers or os.cpu_count() or 1
+        chunksize = max(1, len(tasks) // (4 * workers))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            outputs = list(pool.map(_run_task, tasks, chunksize=chunksize))
+
+    results = {}
+    for task, output in zip(tasks, outputs):
+        results.setdefault(param_key(task[0]), []).append(output)
+    return results
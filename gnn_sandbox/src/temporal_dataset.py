@@ -0,0 +1,103 @@
+import json
+import os
+
+import numpy as np
+from src.trace import round_batch
+
+# Temporal PyTorch Geometric dataset straight from a PDEngine run.
+# One edge_index (both directions of every edge of the simulated graph) is shared
+# by all rounds; round t has node features x[t] (num_nodes x num_features, float32)
+# and labels y[t] (the action each node plays in round t + 1).
+# x and y are stored round-major so every round is one contiguous block, and
+# torch.from_numpy turns it into a tensor without copying. With a path, the arrays
+# are .npy files filled in place through np.memmap, so runs larger than RAM work and
+# training can open them as soon as the simulation ends.
+# torch / torch_geometric are only imported when tensors are requested.
+
+DEFAULT_FEATURES = ('degree', 'current_action', 'payoff', 'prev_payoff',
+                    'coop_neighbors', 'defector_neighbors', 'triggered')
+
+
+def edge_index_array(indptr, indices):
+    # (2, num_edges) int64, the dtype PyG expects for edge_index
+    src = np.repeat(np.arange(len(indptr) - 1, dtype=np.int64), np.diff(indptr))
+    return np.stack([src, indices.astype(np.int64)])
+
+
+def _allocate(path, name, shape, dtype):
+    if path is None:
+        return np.empty(shape, dtype=dtype)
+    return np.lib.format.open_memmap(os.path.join(path, f"{name}.npy"), mode='w+', dtype=dtype, shape=shape)
+
+
+def export_temporal_dataset(engine, num_rounds, features=DEFAULT_FEATURES, path=None):
+    # Play num_rounds rounds on engine, recording features after each round's payoffs
+    # and the action chosen for the next round as the label
+    features = list(features)
+    if path is not None:
+        os.makedirs(path, exist_ok=True)
+    n = engine.num_nodes
+    edge_index = _allocate(path, 'edge_index', (2, len(engine.indices)), np.int64)
+    edge_index[:] = edge_index_array(engine.indptr, engine.indices)
+    strategy = _allocate(path, 'strategy', (n,), np.int16)
+    strategy[:] = engine.strategy
+    x = _allocate(path, 'x', (num_rounds, n, len(features)), np.float32)
+    y = _allocate(path, 'y', (num_rounds, n), np.int64)
+    for round_num in range(num_rounds):
+        engine.play_round()
+        batch = round_batch(engine, round_num)
+        for column, name in enumerate(features):
+            x[round_num, :, column] = batch[name]
+        engine.update_actions()
+        y[round_num] = engine.action
+
+    if path is not None:
+        for array in (edge_index, strategy, x, y):
+            array.flush()
+        with open(os.path.join(path, "meta.json"), 'w') as f:
+            json.dump({'features': features, 'num_rounds': num_rounds, 'num_nodes': n,
+                       'strategy_names': list(engine.strategy_names)}, f, indent=2)
+    return TemporalPDDataset(edge_index, x, y, features, strategy, list(engine.strategy_names))
+
+
+class TemporalPDDataset:
+    def __init__(self, edge_index, x, y, features, strategy=None, strategy_names=None):
+        self.edge_index_np = edge_index
+        self.x = x
+        self.y = y
+        self.features = list(features)
+        self.strategy = strategy
+        self.strategy_names = strategy_names
+        self._edge_index = None
+
+    @classmethod
+    def load(cls, path):
+        # Memory-mapped copy-on-write views: nothing is read until a round is used,
+        # and the arrays stay writable so torch.from_numpy can share them
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='c')
+                  for name in ('edge_index', 'x', 'y', 'strategy')}
+        return cls(arrays['edge_index'], arrays['x'], arrays['y'], meta['features'],
+                   arrays['strategy'], meta['strategy_names'])
+
+    def __len__(self):
+        return len(self.x)
+
+    @property
+    def edge_index(self):
+        import torch
+        if self._edge_index is None:
+            self._edge_index = torch.from_numpy(self.edge_index_np)
+        return self._edge_index
+
+    def __getitem__(self, round_num):
+        # torch_geometric.data.Data for one round, sharing memory with the arrays
+        import torch
+        from torch_geometric.data import Data
+        return Data(x=torch.from_numpy(self.x[round_num]), edge_index=self.edge_index,
+                    y=torch.from_numpy(self.y[round_num]))
+
+    def __iter__(self):
+        for round_num in range(len(self)):
+            yield self[round_num]
@@ -0,0 +1,259 @@
+import json
+import os
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+from src.graph_gen import CSRGraph, _segments, barabasi_albert_csr, erdos_renyi_csr, watts_strogatz_csr
+from src.pd_engine import graph_to_csr
+
+# Topology statistics on sparse (CSR) adjacency, for characterizing candidate
+# simulation graphs at 10^5-10^6 nodes, where a dense adjacency matrix or all-pairs
+# shortest paths are out of reach:
+#   - clustering: triangles per node from the degree-ordered wedges of every node,
+#     checked against the sorted edge keys in NumPy batches
+#   - path length: BFS from a random sample of sources, with a normal confidence
+#     interval (exact, with a zero-width interval, once every node is a source)
+#   - spectral embedding: Laplacian eigenmap from scipy's sparse eigensolver (scipy is
+#     only imported there); the rows can go straight into KMeans instead of the
+#     dense adjacency rows
+# Graphs can be a graph_gen.CSRGraph, a PDEngine or a networkx graph.
+# TopologyCache keeps results per (generator, n, k, p, seed) so sweeps only pay for
+# new parameter points, optionally persisted to a directory.
+
+
+def _as_csr(G):
+    if isinstance(G, CSRGraph):
+        return G
+    if hasattr(G, 'indptr'):
+        return CSRGraph(G.indptr, G.indices)
+    _, indptr, indices = graph_to_csr(G)
+    return CSRGraph(indptr, indices)
+
+
+def triangle_counts(G, chunk_pairs=1 << 24):
+    # Triangles through every node. Edges point from lower to higher (degree, id)
+    # rank, so each triangle is found once, as a pair of forward neighbours of its
+    # lowest-ranked node; at most chunk_pairs pairs are tested at a time.
+    G = _as_csr(G)
+    n = G.num_nodes
+    u, v = (a.astype(np.int64) for a in G.edge_list())
+    keys = np.sort(u * n + v)
+    degree = G.degree
+    rank = np.empty(n, dtype=np.int64)
+    rank[np.lexsort((np.arange(n), degree))] = np.arange(n)
+    flip = rank[u] > rank[v]
+    lo, hi = np.where(flip, v, u), np.where(flip, u, v)
+    order = np.argsort(lo, kind='stable')
+    lo, hi = lo[order], hi[order]
+    row_end = np.cumsum(np.bincount(lo, minlength=n))
+    # pairs (a, b) with b a later entry of the same row
+    pairs_after = row_end[lo] - np.arange(len(lo)) - 1
+    cum_pairs = np.cumsum(pairs_after)
+
+    counts = np.zeros(n, dtype=np.int64)
+    start = 0
+    while start < len(lo):
+        done = cum_pairs[start - 1] if start else 0
+        stop = max(int(np.searchsorted(cum_pairs, done + chunk_pairs, side='right')), start + 1)
+        entries = np.arange(start, stop)
+        a = np.repeat(entries, pairs_after[start:stop])
+        b = _segments(entries + 1, pairs_after[start:stop])
+        x, y = hi[a], hi[b]
+        query = np.minimum(x, y) * n + np.maximum(x, y)
+        pos = np.minimum(np.searchsorted(keys, query), len(keys) - 1)
+        closed = keys[pos] == query
+        for nodes in (lo[a], x, y):
+            counts += np.bincount(nodes[closed], minlength=n)
+        start = stop
+    return counts
+
+
+def clustering_coefficients(G):
+    # Local clustering per node (0 below degree 2, like nx.clustering)
+    G = _as_csr(G)
+    degree = G.degree.astype(float)
+    pairs = degree * (degree - 1) / 2
+    return np.divide(triangle_counts(G), pairs, out=np.zeros(len(degree)), where=pairs > 0)
+
+
+def average_clustering(G):
+    return float(clustering_coefficients(G).mean())
+
+
+def transitivity(G):
+    # Global clustering: 3 * triangles / connected triples
+    G = _as_csr(G)
+    degree = G.degree.astype(np.int64)
+    triples = int((degree * (degree - 1) // 2).sum())
+    return float(triangle_counts(G).sum() / triples) if triples else 0.0
+
+
+def bfs_distances(G, source):
+    # Hop distance from source to every node, -1 where unreachable
+    G = _as_csr(G)
+    degree = G.degree
+    dist = np.full(G.num_nodes, -1, dtype=np.int64)
+    slot = np.empty(G.num_nodes, dtype=np.int64)  # scratch for deduplicating without a sort
+    dist[source] = 0
+    frontier = np.array([source])
+    level = 0
+    while len(frontier):
+        level += 1
+        neighbors = G.indices[_segments(G.indptr[frontier], degree[frontier])]
+        neighbors = neighbors[dist[neighbors] < 0]
+        order = np.arange(len(neighbors))
+        slot[neighbors] = order
+        frontier = neighbors[slot[neighbors] == order]
+        dist[frontier] = level
+    return dist
+
+
+def average_path_length(G, num_sources=64, confidence=0.95, rng=None):
+    # Mean shortest path length estimated from BFS trees of num_sources random
+    # sources: the mean over sources of their mean distance to the nodes they reach
+    # (nx.average_shortest_path_length for a connected graph), with a normal
+    # interval using the finite population correction. 'reachable' is the mean
+    # fraction of other nodes a source reaches (1.0 when connected).
+    G = _as_csr(G)
+    n = G.num_nodes
+    rng = np.random.default_rng(rng)
+    sources = np.arange(n) if num_sources >= n else rng.choice(n, size=num_sources, replace=False)
+    means = np.full(len(sources), np.nan)
+    reached = np.zeros(len(sources))
+    for i, source in enumerate(sources):
+        dist = bfs_distances(G, source)
+        hit = dist[dist > 0]
+        if len(hit):
+            means[i] = hit.mean()
+            reached[i] = len(hit) / (n - 1)
+    means = means[~np.isnan(means)]
+    k = len(means)
+    mean = float(means.mean()) if k else float('nan')
+    std_err = float(means.std(ddof=1) / np.sqrt(k) * np.sqrt((n - k) / (n - 1))) if k > 1 else 0.0
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    return {
+        'path_length': mean,
+        'ci_low': mean - z * std_err,
+        'ci_high': mean + z * std_err,
+        'std_err': std_err,
+        'num_sources': len(sources),
+        'reachable': float(reached.mean()) if len(sources) else float('nan'),
+    }
+
+
+def spectral_embedding(G, dim=2, tol=1e-6, maxiter=None, seed=0):
+    # Laplacian eigenmap: the eigenvectors of the dim smallest non-trivial eigenvalues
+    # of the normalized Laplacian, i.e. the largest of D^-1/2 A D^-1/2, scaled by
+    # D^-1/2. Returns an (num_nodes, dim) array.
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.linalg import eigsh
+    G = _as_csr(G)
+    n = G.num_nodes
+    degree = G.degree.astype(float)
+    inv_sqrt = np.divide(1.0, np.sqrt(degree), out=np.zeros(n), where=degree > 0)
+    rows = np.repeat(np.arange(n), G.degree)
+    N = csr_matrix((inv_sqrt[rows] * inv_sqrt[G.indices], G.indices, G.indptr), shape=(n, n))
+    v0 = np.random.default_rng(seed).random(n)
+    values, vectors = eigsh(N, k=dim + 1, which='LA', tol=tol, maxiter=maxiter, v0=v0)
+    order = np.argsort(values)[::-1][1:]
+    return vectors[:, order] * inv_sqrt[:, None]
+
+
+def topology_summary(G, num_sources=64, confidence=0.95, rng=None):
+    G = _as_csr(G)
+    degree = G.degree.astype(np.int64)
+    triangles = triangle_counts(G)
+    pairs = degree * (degree - 1) / 2
+    local = np.divide(triangles, pairs, out=np.zeros(len(degree)), where=pairs > 0)
+    summary = {
+        'num_nodes': G.num_nodes,
+        'num_edges': G.num_edges,
+        'mean_degree': float(degree.mean()) if len(degree) else 0.0,
+        'clustering_coefficient': float(local.mean()) if len(local) else 0.0,
+        'transitivity': float(triangles.sum() / pairs.sum()) if pairs.sum() else 0.0,
+    }
+    summary.update(average_path_length(G, num_sources, confidence, rng))
+    return summary
+
+
+# k is the mean degree for every generator; p is the rewiring probability of
+# Watts-Strogatz and unused by the others
+GRAPH_GENERATORS = {
+    'watts_strogatz': lambda n, k, p, rng: watts_strogatz_csr(n, k, p, rng),
+    'erdos_renyi': lambda n, k, p, rng: erdos_renyi_csr(n, k / (n - 1), rng),
+    'barabasi_albert': lambda n, k, p, rng: barabasi_albert_csr(n, max(1, k // 2), rng),
+}
+
+
+class TopologyCache:
+    # Summaries and spectral embeddings per (generator, n, k, p, seed). With path,
+    # summaries are kept in path/summaries.json and embeddings as .npy files next to
+    # it, and reused by later runs. The seed drives both the graph and the BFS
+    # source sample.
+    def __init__(self, path=None, num_sources=64, confidence=0.95):
+        self.path = path
+        self.num_sources = num_sources
+        self.confidence = confidence
+        self.summaries = {}
+        self.embeddings = {}
+        self._last_graph = (None, None)
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+            if os.path.exists(self._summary_file):
+                with open(self._summary_file) as f:
+                    for row in json.load(f):
+                        self.summaries[self._key(row)] = row
+
+    @property
+    def _summary_file(self):
+        return os.path.join(self.path, 'summaries.json')
+
+    @staticmethod
+    def _key(row):
+        return row['generator'], row['n'], row['k'], row['p'], row['seed']
+
+    @staticmethod
+    def _rngs(seed):
+        return [np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(2)]
+
+    def graph(self, generator, n, k, p, seed=0):
+        # The most recent graph is kept so a summary and an embedding of the same
+        # point share one build
+        key = (generator, n, k, p, seed)
+        if self._last_graph[0] != key:
+            if generator not in GRAPH_GENERATORS:
+                raise ValueError(f"Unknown generator: {generator}, expected one of {sorted(GRAPH_GENERATORS)}")
+            self._last_graph = (key, GRAPH_GENERATORS[generator](n, k, p, self._rngs(seed)[0]))
+        return self._last_graph[1]
+
+    def summary(self, generator, n, k, p, seed=0):
+        key = (generator, n, k, p, seed)
+        if key not in self.summaries:
+            row = {'generator': generator, 'n': n, 'k': k, 'p': p, 'seed': seed}
+            row.update(topology_summary(self.graph(*key), self.num_sources, self.confidence, self._rngs(seed)[1]))
+            self.summaries[key] = row
+            if self.path is not None:
+                with open(self._summary_file, 'w') as f:
+                    json.dump(list(self.summaries.values()), f, indent=1)
+        return self.summaries[key]
+
+    def embedding(self, generator, n, k, p, seed=0, dim=2):
+        key = (generator, n, k, p, seed, dim)
+        if key not in self.embeddings:
+            file = os.path.join(self.path, 'embedding_{}_{}_{}_{}_{}_{}.npy'.format(*key)) if self.path else None
+            if file is not None and os.path.exists(file):
+                self.embeddings[key] = np.load(file)
+            else:
+                self.embeddings[key] = spectral_embedding(self.graph(*key[:5]), dim, seed=seed)
+                if file is not None:
+                    np.save(file, self.embeddings[key])
+        return self.embeddings[key]
+
+
+def small_world_sweep(n, k_values, p_values, generator='watts_strogatz', seed=0, cache=None):
+    # Clustering coefficient C and path length L for every (k, p), like the k/p
+    # characterization in sandbox_social_networks.ipynb, sorted by p
+    cache = TopologyCache() if cache is None else cache
+    rows = [cache.summary(generator, n, k, p, seed) for k in k_values for p in p_values]
+    return pd.DataFrame(rows).sort_values(['p', 'k'], ignore_index=True)
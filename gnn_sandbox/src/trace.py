@@ -0,0 +1,166 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# Columnar simulation traces.
+# A round of a PDEngine run is one batch of typed columns (one row per node).
+# TraceWriter copies batches into preallocated buffers and flushes them every
+# chunk_rounds rounds, either as one .npy file per column and chunk or as row
+# groups of a single Parquet file, so memory stays bounded however long the run is.
+# Strategies are stored as ids; the names live in the trace metadata.
+
+TRACE_COLUMNS = {
+    'round': np.int32,
+    'node': np.int64,
+    'degree': np.int32,
+    'current_action': np.int8,
+    'strategy_id': np.int16,
+    'payoff': np.int64,
+    'triggered': np.bool_,
+    'prev_payoff': np.int64,
+    'coop_neighbors': np.int32,
+    'defector_neighbors': np.int32,
+}
+
+
+def round_batch(engine, round_num):
+    # Columns for the current state of the engine (same point as get_node_features)
+    coop = engine.coop_neighbors()
+    return {
+        'round': np.full(engine.num_nodes, round_num, dtype=np.int32),
+        'node': np.arange(engine.num_nodes),
+        'degree': engine.degree,
+        'current_action': engine.action,
+        'strategy_id': engine.strategy,
+        'payoff': engine.payoff,
+        'triggered': engine.triggered,
+        'prev_payoff': engine.prev_payoff,
+        'coop_neighbors': coop,
+        'defector_neighbors': engine.degree - coop,
+    }
+
+
+def iter_round_batches(engine, num_rounds, copy=True):
+    # Play num_rounds rounds, yielding one columnar batch per round.
+    # With copy=False the arrays may be engine state that the next round overwrites.
+    for round_num in range(num_rounds):
+        engine.play_round()
+        batch = round_batch(engine, round_num)
+        yield {name: np.array(col) for name, col in batch.items()} if copy else batch
+        engine.update_actions()
+
+
+class TraceWriter:
+    def __init__(self, path, engine, chunk_rounds=16, fmt='npy', include_memory=False):
+        if fmt not in ('npy', 'parquet'):
+            raise ValueError(f"Unknown trace format: {fmt}")
+        if include_memory and fmt != 'npy':
+            raise ValueError("include_memory is only supported for the npy format")
+        self.path = path
+        self.fmt = fmt
+        self.num_nodes = engine.num_nodes
+        self.chunk_rounds = chunk_rounds
+        self.include_memory = include_memory
+        self.meta = {
+            'num_nodes': engine.num_nodes,
+            'num_edges': len(engine.indices),
+            'strategy_names': list(engine.strategy_names),
+            'columns': list(TRACE_COLUMNS),
+            'format': fmt,
+            'chunks': 0,
+            'rounds': 0,
+        }
+        dtypes = dict(TRACE_COLUMNS, payoff=engine.payoff.dtype, prev_payoff=engine.payoff.dtype)
+        self.buffers = {name: np.empty(chunk_rounds * engine.num_nodes, dtype=dtype)
+                        for name, dtype in dtypes.items()}
+        if include_memory:
+            self.memory_buffer = np.empty((chunk_rounds, len(engine.indices)), dtype=np.int8)
+        self.filled = 0
+        self._parquet = None
+        os.makedirs(path, exist_ok=True)
+
+    def write_round(self, engine, round_num):
+        if self.include_memory:
+            self.memory_buffer[self.filled] = engine.memory
+        self.write_batch(round_batch(engine, round_num))
+
+    def write_batch(self, batch):
+        # batch as yielded by iter_round_batches (carries no memory)
+        start = self.filled * self.num_nodes
+        for name, buffer in self.buffers.items():
+            buffer[start:start + self.num_nodes] = batch[name]
+        self.filled += 1
+        self.meta['rounds'] += 1
+        if self.filled == self.chunk_rounds:
+            self.flush()
+
+    def flush(self):
+        if self.filled == 0:
+            return
+        rows = self.filled * self.num_nodes
+        chunk = self.meta['chunks']
+        if self.fmt == 'npy':
+            for name, buffer in self.buffers.items():
+                np.save(os.path.join(self.path, f"{name}-{chunk:05d}.npy"), buffer[:rows])
+            if self.include_memory:
+                np.save(os.path.join(self.path, f"memory-{chunk:05d}.npy"), self.memory_buffer[:self.filled])
+        else:
+            self._write_parquet(rows)
+        self.meta['chunks'] += 1
+        self.filled = 0
+
+    def _write_parquet(self, rows):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet traces need pyarrow (pip install pyarrow)")
+        table = pa.table({name: buffer[:rows] for name, buffer in self.buffers.items()})
+        if self._parquet is None:
+            self._parquet = pq.ParquetWriter(os.path.join(self.path, "trace.parquet"), table.schema)
+        self._parquet.write_table(table)
+
+    def close(self):
+        self.flush()
+        if self._parquet is not None:
+            self._parquet.close()
+            self._parquet = None
+        with open(os.path.join(self.path, "meta.json"), 'w') as f:
+            json.dump(self.meta, f, indent=2)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_trace(path, columns=None, mmap=True):
+    # Read a trace back as a DataFrame with a strategy_type name column.
+    # npy chunks are memory-mapped, so only the requested columns are read.
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    columns = columns or meta['columns']
+    if meta['format'] == 'parquet':
+        import pyarrow.parquet as pq
+        df = pq.read_table(os.path.join(path, "trace.parquet"), columns=columns).to_pandas()
+    else:
+        mode = 'r' if mmap else None
+        df = pd.DataFrame({
+            name: np.concatenate([np.load(os.path.join(path, f"{name}-{chunk:05d}.npy"), mmap_mode=mode)
+                                  for chunk in range(meta['chunks'])])
+            for name in columns
+        })
+    if 'strategy_id' in df:
+        df['strategy_type'] = np.asarray(meta['strategy_names'])[df['strategy_id'].to_numpy()]
+    return df
+
+
+def load_trace_memory(path):
+    # (rounds, num_edges) int8 memory of a trace written with include_memory=True
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    return np.concatenate([np.load(os.path.join(path, f"memory-{chunk:05d}.npy"), mmap_mode='r')
+                           for chunk in range(meta['chunks'])])
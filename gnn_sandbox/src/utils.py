@@ -1,44 +1,30 @@
 import os
 import json
 
-def analyze_strategy_performance(G):
-    strategy_data = {}
-    
-    for node in G.nodes:
-        strategy = G.nodes[node]['strategy_type']
-        payoff = G.nodes[node]['payoff']
-        
-        if strategy not in strategy_data:
-            strategy_data[strategy] = {
-                'total_payoff': 0,
-                'count': 0,
-                'min_payoff': float('inf'),
-                'max_payoff': float('-inf')
-            }
-        
-        strategy_data[strategy]['total_payoff'] += payoff
-        strategy_data[strategy]['count'] += 1
-        strategy_data[strategy]['min_payoff'] = min(strategy_data[strategy]['min_payoff'], payoff)
-        strategy_data[strategy]['max_payoff'] = max(strategy_data[strategy]['max_payoff'], payoff)
-        
-    strategy_summary = []
-    for strategy, data in strategy_data.items():
-        avg_payoff = data['total_payoff'] / data['count']
-        strategy_summary.append({
-            'strategy': strategy,
-            'average_payoff': avg_payoff,
-            'min_payoff': data['min_payoff'],
-            'max_payoff': data['max_payoff'],
-            'total_payoff': data['total_payoff'],
-            'total_nodes': data['count']
-        })
-    
-    strategy_summary.sort(key=lambda x: x['average_payoff'], reverse=True)
-    
-    print(f"{'Strategy':<15}{'Avg Payoff':<12}{'Min Payoff':<12}{'Max Payoff':<12}{'Total Payoff':<15}{'Node Count':<10}")
-    for entry in strategy_summary:
-        print(f"{entry['strategy']:<15}{entry['average_payoff']:<12.2f}{entry['min_payoff']:<12.2f}"
-              f"{entry['max_payoff']:<12.2f}{entry['total_payoff']:<15.2f}{entry['total_nodes']:<10}")
+import numpy as np
+from src.analytics import stats_frame, strategy_stats
+
+def analyze_strategy_performance(G, print_table=False):
+    # Per-strategy payoff summary of the current round, best average payoff first.
+    # G is a networkx graph with node attributes or a PDEngine; see analytics.py for
+    # the per-round version that accumulates during a run.
+    if hasattr(G, 'strategy_names'):
+        names = list(G.strategy_names)
+        strategy, payoff, action = G.strategy, G.payoff, G.action
+    else:
+        data = G.nodes(data=True)
+        names, strategy = np.unique([d['strategy_type'] for _, d in data], return_inverse=True)
+        payoff = np.fromiter((d['payoff'] for _, d in data), dtype=np.float64, count=len(G))
+        action = np.fromiter((d['current_action'] for _, d in data), dtype=np.float64, count=len(G))
+    summary = stats_frame(strategy_stats(strategy, payoff, action, len(names)), names)
+    summary = summary.sort_values('mean_payoff', ascending=False, kind='stable').reset_index(drop=True)
+
+    if print_table:
+        print(f"{'Strategy':<15}{'Avg Payoff':<12}{'Min Payoff':<12}{'Max Payoff':<12}{'Total Payoff':<15}{'Node Count':<10}")
+        for entry in summary.itertuples():
+            print(f"{entry.strategy:<15}{entry.mean_payoff:<12.2f}{entry.min_payoff:<12.2f}"
+                  f"{entry.max_payoff:<12.2f}{entry.total_payoff:<15.2f}{entry.count:<10}")
+    return summary
 
 
 def load_config(config_path="src/config.json"):
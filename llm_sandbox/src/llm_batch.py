@@ -0,0 +1,104 @@
+import asyncio
+import concurrent.futures
+import time
+from collections import namedtuple
+
+from src.llm_connector import achat_with_model, achat_with_model_history, detect_provider
+
+# Fan many chat requests out concurrently. Each provider gets its own concurrency
+# limit (open requests at a time) and optional token-bucket rate limit (requests per
+# second), so a slow or strict provider does not hold back the others.
+# Results come back in request order; a failed request carries its exception in
+# .error instead of aborting the batch.
+#
+#   results = chat_batch([{'model_name': 'gpt-4o-mini', 'user_message': prompt} for prompt in prompts],
+#                        concurrency={'openai': 8}, rate_limits={'openai': 5})
+#   texts = [r.response for r in results if r.ok]
+
+DEFAULT_CONCURRENCY = 4
+
+
+class BatchResult(namedtuple('BatchResult', 'index model_name response error')):
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class TokenBucket:
+    # rate tokens per second, bursts of up to capacity; acquire() waits for a token
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, tokens=1):
+        async with self._lock:
+            self._refill()
+            while self.tokens < tokens:
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= tokens
+
+
+def _normalize(request):
+    # dict with model_name and either user_message (+ system_message) or messages,
+    # or a (model_name, user_message[, system_message]) tuple
+    if isinstance(request, dict):
+        return dict(request)
+    model_name, user_message, *rest = request
+    return {'model_name': model_name, 'user_message': user_message,
+            'system_message': rest[0] if rest else None}
+
+
+async def achat_batch(requests, concurrency=None, rate_limits=None, base_url=None):
+    # concurrency / rate_limits: {provider: limit}, provider as in detect_provider
+    # ('openai', 'anthropic', 'ollama', ...); missing providers get DEFAULT_CONCURRENCY
+    # and no rate limit. base_url applies to requests that do not set their own.
+    requests = [_normalize(request) for request in requests]
+    concurrency = concurrency or {}
+    rate_limits = rate_limits or {}
+    semaphores, buckets = {}, {}
+    for request in requests:
+        provider = detect_provider(request['model_name'])
+        if provider not in semaphores:
+            semaphores[provider] = asyncio.Semaphore(concurrency.get(provider, DEFAULT_CONCURRENCY))
+            if rate_limits.get(provider):
+                buckets[provider] = TokenBucket(rate_limits[provider])
+
+    async def run(index, request):
+        model_name = request['model_name']
+        provider = detect_provider(model_name)
+        url = request.get('base_url', base_url)
+        async with semaphores[provider]:
+            if provider in buckets:
+                await buckets[provider].acquire()
+            try:
+                if 'messages' in request:
+                    response = await achat_with_model_history(model_name, request['messages'], url)
+                else:
+                    response = await achat_with_model(model_name, request['user_message'],
+                                                      request.get('system_message'), url)
+            except Exception as exc:
+                return BatchResult(index, model_name, None, exc)
+        return BatchResult(index, model_name, response, None)
+
+    return list(await asyncio.gather(*(run(i, request) for i, request in enumerate(requests))))
+
+
+def chat_batch(requests, concurrency=None, rate_limits=None, base_url=None):
+    # Blocking wrapper; inside a running event loop (e.g. Jupyter) the batch runs on
+    # its own loop in a helper thread
+    coroutine = achat_batch(requests, concurrency, rate_limits, base_url)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
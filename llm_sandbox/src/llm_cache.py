@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Response cache for chat calls. The key is a SHA-256 of the canonical JSON of
+# (provider, model, messages, generation parameters), so the same prompt sent
+# twice maps to the same entry regardless of dict ordering.
+# Entries live in a SQLite file (survives kernel restarts) behind an in-memory LRU
+# of the most recently used ones; expired entries (ttl, seconds) and the least
+# recently used ones beyond max_entries are evicted. Recency is kept in the SQLite
+# 'accessed' column; reads served from memory are written there in a batch before the
+# next eviction, write or close.
+#
+#   from src.llm_cache import ResponseCache
+#   from src.llm_connector import set_response_cache
+#   set_response_cache(ResponseCache(".llm_cache.sqlite", ttl=7 * 24 * 3600))
+#   chat_with_model('gpt-4o-mini', prompt)                     # cached
+#   chat_with_model('gpt-4o-mini', prompt, bypass_cache=True)  # fresh answer, stored again
+
+DEFAULT_PATH = ".llm_cache.sqlite"
+
+
+def cache_key(model_name, provider, messages, params=None):
+    payload = {'provider': provider, 'model': model_name, 'messages': messages, 'params': params or {}}
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path=DEFAULT_PATH, ttl=None, max_entries=100_000, memory_entries=1024):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.hits = 0
+        self.memory_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()  # key -> (created, response)
+        self._touched = {}  # key -> access time of memory hits not yet written to SQLite
+        self._lock = threading.Lock()
+        if path != ':memory:' and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS responses "
+                         "(key TEXT PRIMARY KEY, response TEXT, created REAL, accessed REAL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._db.commit()
+        self._count = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def _expired(self, created, now):
+        return self.ttl is not None and now - created > self.ttl
+
+    def _remember(self, key, created, response):
+        self._memory[key] = (created, response)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        # Cached response or None
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and not self._expired(entry[0], now):
+                self._memory.move_to_end(key)
+                self._touched[key] = now
+                self.hits += 1
+                self.memory_hits += 1
+                return entry[1]
+            row = self._db.execute("SELECT created, response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or self._expired(row[0], now):
+                if row is not None:
+                    self._delete(key)
+                self._memory.pop(key, None)
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self._remember(key, row[0], row[1])
+            self.hits += 1
+            return row[1]
+
+    def set(self, key, response):
+        now = time.time()
+        with self._lock:
+            self._touched.pop(key, None)
+            self._flush_touched()
+            exists = self._db.execute("SELECT 1 FROM responses WHERE key = ?", (key,)).fetchone()
+            self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (key, response, now, now))
+            self._count += exists is None
+            self._remember(key, now, response)
+            if self._count > self.max_entries:
+                self._evict(self._count - self.max_entries)
+            self._db.commit()
+
+    def _flush_touched(self):
+        if self._touched:
+            self._db.executemany("UPDATE responses SET accessed = ? WHERE key = ?",
+                                 [(accessed, key) for key, accessed in self._touched.items()])
+            self._touched.clear()
+
+    def _delete(self, key):
+        self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+        self._db.commit()
+        self._count -= 1
+
+    def _evict(self, excess):
+        # Least recently used first
+        keys = [row[0] for row in self._db.execute(
+            "SELECT key FROM responses ORDER BY accessed LIMIT ?", (excess,))]
+        self._db.executemany("DELETE FROM responses WHERE key = ?", [(key,) for key in keys])
+        for key in keys:
+            self._memory.pop(key, None)
+        self._count -= len(keys)
+
+    def expire(self):
+        # Drop every entry older than ttl; returns how many were removed
+        if self.ttl is None:
+            return 0
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            removed = self._db.execute("DELETE FROM responses WHERE created < ?", (cutoff,)).rowcount
+            self._db.commit()
+            self._memory = OrderedDict((k, v) for k, v in self._memory.items() if v[0] >= cutoff)
+            self._count -= removed
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+            self._memory.clear()
+            self._touched.clear()
+            self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'memory_hits': self.memory_hits, 'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else None, 'entries': self._count}
+
+    def close(self):
+        with self._lock:
+            self._flush_touched()
+            self._db.commit()
+            self._db.close()
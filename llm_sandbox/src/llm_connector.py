@@ -1,172 +1,113 @@
-import os
-
-from openai import OpenAI
-import ollama
-# from mistralai.client import MistralClient
-import google.generativeai as genai
-from anthropic import Anthropic
-from groq import Groq
-
-def create_model_client(model_name):
-    provider_mapping = {
-        'openai': ['gpt'],
-        'google': ['gemini'],
-        'anthropic': ['claude'],
-        'grok': ['grok'],
-        'ollama': ['llama3.2', 'meta', 'deepseek'],
-        'mistral': ['mistral', 'mixtral', 'codestral'],
-        'groq': ['groq','gemma2-9b-it','llama-3.3-70b-versatile','llama-3.1-8b-instant','llama-guard-3-8b','llama3-70b-8192','llama3-8b-8192','whisper-large-v3', 'whisper-large-v3-turbo','distil-whisper-large-v3-en'],
-    }
-    
-    provider = 'ollama'  # default provider
-    for prov, prefixes in provider_mapping.items():
-        if any(model_name.startswith(prefix) for prefix in prefixes):
-            provider = prov
-            break
-
-    print(f"Detected provider: {provider}")
-    # if provider == 'mistral' and 'MISTRAL_API_KEY' not in os.environ:
-    #     provider = 'ollama'
-    
-    if provider == 'openai':
-        openai_api_key = os.getenv('OPENAI_API_KEY')
-        return OpenAI(api_key=openai_api_key), model_name, 'OpenAI'
-    
-    elif provider == 'mistral':
-        # mistral_api_key = os.getenv('MISTRAL_API_KEY')
-        # return MistralClient(api_key=mistral_api_key), model_name, 'Mistral'
-        provider == 'ollama'
-
-    if provider == 'ollama':
-        models = ollama.list().get('models', [])
-        model_exists = any(m.get('name') == model_name for m in models)
-        if not model_exists:
-            print(f"Model '{model_name}' not found locally. Pulling from Ollama...")
-            ollama.pull(model_name)
-            print(f"Successfully pulled model: {model_name}")
-        return ollama, model_name, 'Ollama'
-    
-    elif provider == 'google':
-        google_api_key = os.getenv('GOOGLE_API_KEY')
-        genai.configure(api_key=google_api_key)
-        return genai, model_name, 'Google Gemini'
-    
-    elif provider == 'anthropic':
-        anthropic_api_key = os.getenv('ANTHROPIC_API_KEY')
-        return Anthropic(api_key=anthropic_api_key), model_name, 'Anthropic'
-    
-    elif provider == 'groq':
-        groq_api_key = os.getenv('GROQ_API_KEY')
-        return Groq(api_key=groq_api_key), model_name, 'Groq'
-    
-    elif provider == 'grok':  
-        grok_api_key = os.getenv('GROK_API_KEY') 
-        return OpenAI(api_key=grok_api_key, base_url="https://api.x.ai/v1"), model_name, 'Grok with OpenAIAPI'
-    
-    else:
-        raise ValueError(f"Unsupported model provider: {model_name},{provider}")
-
-
-def chat_with_model(model_name, user_message, system_message=None):
-    client, model, provider_name = create_model_client(model_name)
-    print(f"Using {provider_name} with model: {model}")
+import time
+
+from src.llm_metrics import acall_with_retries, call_with_retries, record_call
+from src.llm_providers import (PROVIDERS, ClientRegistry, OllamaModels, client_registry, detect_provider,
+                               ollama_models, provider_for, register_provider)
+
+# Chat with any supported model through one call. The provider is picked from the
+# model name (see llm_providers.py, where backends are registered and their SDKs
+# imported on first use); every request goes through the same dispatch path:
+# cache lookup -> cached provider client -> provider.complete -> cache store.
+# Calls are retried on rate limits and recorded to the metric sinks (see llm_metrics.py).
+
+
+def create_model_client(model_name, base_url=None):
+    # base_url overrides the provider endpoint (e.g. a proxy, or the Ollama host)
+    provider = provider_for(model_name)
+    print(f"Detected provider: {provider.name}")
+    return provider.client(model_name, base_url), model_name, provider.label
+
+
+def create_async_model_client(model_name, base_url=None):
+    # (client, model, provider_name) like create_model_client, or None when the
+    # provider has no native async client. Call from inside the event loop.
+    provider = provider_for(model_name)
+    client = provider.async_client(model_name, base_url)
+    return None if client is None else (client, model_name, provider.label)
+
+
+def _create_client(create, model_name, base_url, kind, start):
+    # create(model_name, base_url), with a failure (unsupported provider, failed Ollama
+    # pull, missing SDK) recorded to the metric sinks like a failed call
+    try:
+        return create(model_name, base_url)
+    except Exception as exc:
+        record_call(detect_provider(model_name), model_name, kind, start, error=exc)
+        raise
+
+
+# Optional response cache (see llm_cache.py), shared by every chat function.
+# bypass_cache=True skips the lookup but still stores the fresh response.
+response_cache = None
+
+
+def set_response_cache(cache):
+    # A llm_cache.ResponseCache, or None to turn caching off
+    global response_cache
+    response_cache = cache
+
+
+def _cache_lookup(model_name, messages, base_url, bypass_cache):
+    # (key, cached response); key is None when caching is off
+    if response_cache is None:
+        return None, None
+    from src.llm_cache import cache_key
+    params = {'base_url': base_url} if base_url else None
+    key = cache_key(model_name, detect_provider(model_name), messages, params)
+    return key, None if bypass_cache else response_cache.get(key)
+
+
+def _messages(user_message, system_message):
     messages = []
     if system_message:
         messages.append({"role": "system", "content": system_message})
     messages.append({"role": "user", "content": user_message})
-    provider_handlers = {
-        'OpenAI': lambda: client.chat.completions.create(
-            model=model,
-            messages=messages
-        ).choices[0].message.content,
-        
-        'Ollama': lambda: client.chat(
-            model=model, 
-            messages=messages
-        )['message']['content'],
-        
-        'Mistral': lambda: client.chat(
-            model=model,
-            messages=messages
-        ).choices[0].message.content,
-        
-        'Anthropic': lambda: client.messages.create(
-            model=model,
-            system=system_message if system_message else None,
-            messages=[{"role": "user", "content": user_message}],
-            max_tokens=500
-        ).content[0].text,
-        
-        'Groq': lambda: client.chat.completions.create(
-            model=model,
-            messages=messages
-        ).choices[0].message.content,
-
-        'Google Gemini': lambda: client.GenerativeModel(model).generate_content(
-            [{
-                "role": "user" if msg["role"] == "user" else "model", "parts": [msg["content"]]
-            } for msg in messages]
-        ).text if system_message else client.GenerativeModel(model).generate_content(user_message).text,
-
-        'Grok with OpenAIAPI': lambda: client.chat.completions.create(
-            model=model,
-            messages=messages
-        ).choices[0].message.content
-    }
-
-    handler = provider_handlers.get(provider_name)
-    if handler:
-        return handler()
-    else:
-        return "Unsupported provider"
-
-
-
-def chat_with_model_history(model_name, messages):
-    client, model, provider_name = create_model_client(model_name)
-    provider_handlers = {
-        'OpenAI': lambda: client.chat.completions.create(
-            model=model,
-            messages=messages
-        ).choices[0].message.content,
-
-        'Ollama': lambda: client.chat(
-            model=model,
-            messages=messages
-        )['message']['content'],
-
-        'Mistral': lambda: client.chat(
-            model=model,
-            messages=messages
-        ).choices[0].message.content,
-
-        'Anthropic': lambda: client.messages.create(
-            model=model,
-            system=[msg["content"] for msg in messages if msg["role"] == "system"][0] if any(msg["role"] == "system" for msg in messages) else None,
-            messages=[msg for msg in messages if msg["role"] != "system"],
-            max_tokens=500
-        ).content[0].text,
-
-        'Groq': lambda: client.chat.completions.create(
-            model=model,
-            messages=messages
-        ).choices[0].message.content,
-
-        'Google Gemini': lambda: client.GenerativeModel(model).generate_content(
-            [{
-                "role": "user" if msg["role"] == "user" else "model",
-                "parts": [msg["content"]]
-            } for msg in messages]
-        ).text,
-
-        'Grok with OpenAIAPI': lambda: client.chat.completions.create(
-            model=model,
-            messages=messages
-        ).choices[0].message.content
-    }
-
-    handler = provider_handlers.get(provider_name)
-    if handler:
-        return handler()
-    else:
-        raise ValueError(f"Unsupported provider: {provider_name}")
\ No newline at end of file
+    return messages
+
+
+def chat_with_model(model_name, user_message, system_message=None, base_url=None, bypass_cache=False):
+    return chat_with_model_history(model_name, _messages(user_message, system_message), base_url, bypass_cache,
+                                   verbose=True)
+
+
+def chat_with_model_history(model_name, messages, base_url=None, bypass_cache=False, verbose=False):
+    start = time.perf_counter()
+    key, cached = _cache_lookup(model_name, messages, base_url, bypass_cache)
+    if cached is not None:
+        record_call(detect_provider(model_name), model_name, 'chat', start, cached=True)
+        return cached
+    provider = provider_for(model_name)
+    client, model, provider_name = _create_client(create_model_client, model_name, base_url, 'chat', start)
+    if verbose:
+        print(f"Using {provider_name} with model: {model}")
+    response = call_with_retries(lambda: provider.complete(client, model, messages), provider.name, model)
+    if key is not None:
+        response_cache.set(key, response)
+    return response
+
+
+# Async API: providers with a native async client (OpenAI, Anthropic, Groq, Grok,
+# Ollama) await it; the others run the blocking call in the default thread pool.
+
+async def achat_with_model_history(model_name, messages, base_url=None, bypass_cache=False):
+    start = time.perf_counter()
+    key, cached = _cache_lookup(model_name, messages, base_url, bypass_cache)
+    if cached is not None:
+        record_call(detect_provider(model_name), model_name, 'achat', start, cached=True)
+        return cached
+    created = _create_client(create_async_model_client, model_name, base_url, 'achat', start)
+    if created is None:
+        # The blocking call stores the response itself
+        import asyncio
+        return await asyncio.to_thread(chat_with_model_history, model_name, messages, base_url, True)
+    client, model, _ = created
+    provider = provider_for(model_name)
+    response = await acall_with_retries(lambda: provider.acomplete(client, model, messages), provider.name, model)
+    if key is not None:
+        response_cache.set(key, response)
+    return response
+
+
+async def achat_with_model(model_name, user_message, system_message=None, base_url=None, bypass_cache=False):
+    return await achat_with_model_history(model_name, _messages(user_message, system_message), base_url,
+                                          bypass_cache)
@@ -0,0 +1,196 @@
+import functools
+
+from src.llm_connector import chat_with_model_history
+from src.llm_providers import MAX_TOKENS, detect_provider
+
+# Keep multi-turn histories inside a token budget so the payload of each call stays
+# bounded however long the conversation runs.
+# The window sent to the model is: the system prompt, the first keep_first turns
+# (the stable prefix, e.g. the opening question), an optional running summary of the
+# turns that no longer fit, and as many of the latest turns as the budget allows.
+# Token counts are a local estimate: tiktoken when it is installed, otherwise ~4
+# characters per token.
+# The prefix never changes between calls, so providers that cache prompt prefixes
+# can reuse it: OpenAI does so automatically, and for Anthropic the prefix is marked
+# with cache_control.
+#
+#   history = HistoryManager('claude-3-5-haiku-latest', system_prompt, policy='summarize')
+#   reply = history.chat("Hi!")              # or history.add('user', ...) + history.window()
+#
+# For a plain message list: chat_with_model_history(model, fit_history(model, messages)).
+
+# Context window per model-name prefix, first match wins
+CONTEXT_WINDOWS = {
+    'gpt-4o': 128_000,
+    'gpt-4.1': 1_000_000,
+    'gpt-4': 8_192,
+    'gpt-3.5': 16_385,
+    'claude': 200_000,
+    'gemini': 1_000_000,
+    'grok': 131_072,
+    'llama-3': 128_000,
+    'llama3-': 8_192,
+    'gemma2': 8_192,
+}
+DEFAULT_CONTEXT = 8_192  # also Ollama's usual num_ctx range
+MESSAGE_OVERHEAD = 4  # role and separators per message
+
+SUMMARY_PROMPT = ("Summarize the conversation so far in a few sentences, keeping names, facts, "
+                  "decisions and open questions. Reply with the summary only.")
+
+
+@functools.lru_cache(maxsize=None)
+def _encoding(model_name):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        return tiktoken.get_encoding('cl100k_base')
+
+
+def _text(content):
+    # Plain text of a message content (a string or a list of content blocks)
+    if isinstance(content, str):
+        return content
+    return ''.join(block.get('text', '') for block in content)
+
+
+def estimate_tokens(text, model_name='gpt-4o'):
+    encoding = _encoding(model_name)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def message_tokens(message, model_name='gpt-4o'):
+    return estimate_tokens(_text(message['content']), model_name) + MESSAGE_OVERHEAD
+
+
+def context_budget(model_name, reserve=MAX_TOKENS):
+    # Prompt tokens available for model_name, leaving reserve for the answer
+    window = next((size for prefix, size in CONTEXT_WINDOWS.items() if model_name.startswith(prefix)),
+                  DEFAULT_CONTEXT)
+    return window - reserve
+
+
+def mark_prompt_cache(messages):
+    # Anthropic prompt caching: the last message of the stable prefix gets a
+    # cache_control breakpoint (the system prompt is a message here; the provider
+    # turns it into the system parameter)
+    marked = [dict(msg) for msg in messages]
+    if marked:
+        last = marked[-1]
+        blocks = [{'type': 'text', 'text': last['content']}] if isinstance(last['content'], str) \
+            else [dict(block) for block in last['content']]
+        blocks[-1]['cache_control'] = {'type': 'ephemeral'}
+        last['content'] = blocks
+    return marked
+
+
+def _split(messages, keep_first):
+    system = [msg for msg in messages if msg['role'] == 'system']
+    turns = [msg for msg in messages if msg['role'] != 'system']
+    return system, turns[:keep_first], turns[keep_first:]
+
+
+def _fit_recent(turns, budget, model_name):
+    # Longest suffix of turns within budget (at least the last one), starting with
+    # a user turn where possible
+    used, start = 0, len(turns)
+    while start > 0:
+        cost = message_tokens(turns[start - 1], model_name)
+        if used + cost > budget and start < len(turns):
+            break
+        used += cost
+        start -= 1
+    while start < len(turns) - 1 and turns[start]['role'] != 'user':
+        start += 1
+    return start
+
+
+def _assemble(model_name, prefix, summary, recent, mark_cache):
+    if mark_cache is None:
+        mark_cache = detect_provider(model_name) == 'anthropic'
+    prefix = mark_prompt_cache(prefix) if mark_cache else list(prefix)
+    summary = [{'role': 'user', 'content': f"Summary of the earlier conversation: {summary}"}] if summary else []
+    return prefix + summary + list(recent)
+
+
+def fit_history(model_name, messages, budget=None, keep_first=1, mark_cache=None):
+    # Messages to send for a full history: older turns beyond the budget are dropped
+    budget = context_budget(model_name) if budget is None else budget
+    system, pinned, rest = _split(messages, keep_first)
+    fixed = sum(message_tokens(msg, model_name) for msg in system + pinned)
+    start = _fit_recent(rest, budget - fixed, model_name)
+    return _assemble(model_name, system + pinned, None, rest[start:], mark_cache)
+
+
+class HistoryManager:
+    # Stateful history for one model. policy='drop' forgets turns that fall out of the
+    # window; policy='summarize' folds them into a running summary (one extra call per
+    # batch of dropped turns, by summarizer(previous_summary, messages) -> str,
+    # defaulting to the same model). Summaries longer than max_summary_tokens (a
+    # quarter of the budget by default) keep only their end.
+    def __init__(self, model_name, system_prompt=None, budget=None, policy='drop', keep_first=1,
+                 summarizer=None, mark_cache=None, base_url=None, max_summary_tokens=None):
+        if policy not in ('drop', 'summarize'):
+            raise ValueError(f"policy must be 'drop' or 'summarize', got {policy}")
+        self.model_name = model_name
+        self.budget = context_budget(model_name) if budget is None else budget
+        self.policy = policy
+        self.keep_first = keep_first
+        self.summarizer = summarizer or self._summarize
+        self.max_summary_tokens = self.budget // 4 if max_summary_tokens is None else max_summary_tokens
+        self.mark_cache = mark_cache
+        self.base_url = base_url
+        self.messages = [{'role': 'system', 'content': system_prompt}] if system_prompt else []
+        self.summary = None
+        self._folded = 0  # turns after the pinned prefix already dropped or summarized
+        self._tokens = []  # estimate per turn after the pinned prefix
+
+    def add(self, role, content):
+        self.messages.append({'role': role, 'content': content})
+
+    def _summarize(self, previous, messages):
+        transcript = "\n".join(f"{msg['role']}: {_text(msg['content'])}" for msg in messages)
+        if previous:
+            transcript = f"Earlier summary: {previous}\n{transcript}"
+        return chat_with_model_history(self.model_name, [{'role': 'system', 'content': SUMMARY_PROMPT},
+                                                         {'role': 'user', 'content': transcript}], self.base_url)
+
+    def window(self):
+        # Messages for the next call, within budget
+        system, pinned, rest = _split(self.messages, self.keep_first)
+        self._tokens.extend(message_tokens(msg, self.model_name) for msg in rest[len(self._tokens):])
+        prefix_tokens = sum(message_tokens(msg, self.model_name) for msg in system + pinned)
+        # Only turns not folded yet are candidates; earlier ones stay out for good.
+        # A new summary takes room too, so the fit is checked again after folding.
+        for _ in range(2):
+            available = self.budget - prefix_tokens
+            if self.summary:
+                available -= estimate_tokens(self.summary, self.model_name) + 2 * MESSAGE_OVERHEAD
+            start = self._folded
+            used = sum(self._tokens[start:])
+            while used > available and start < len(rest) - 1:
+                used -= self._tokens[start]
+                start += 1
+            while start < len(rest) - 1 and rest[start]['role'] != 'user':
+                start += 1
+            if start == self._folded:
+                break
+            if self.policy == 'summarize':
+                summary = self.summarizer(self.summary, rest[self._folded:start])
+                if estimate_tokens(summary, self.model_name) > self.max_summary_tokens:
+                    summary = summary[-4 * self.max_summary_tokens:]
+                self.summary = summary
+            self._folded = start
+        return _assemble(self.model_name, system + pinned, self.summary, rest[self._folded:], self.mark_cache)
+
+    def chat(self, user_message):
+        self.add('user', user_message)
+        response = chat_with_model_history(self.model_name, self.window(), self.base_url)
+        self.add('assistant', response)
+        return response
@@ -0,0 +1,207 @@
+import json
+import os
+import random
+import threading
+import time
+from collections import namedtuple
+
+# Per-call instrumentation and retries for the chat functions in llm_connector.
+# Every call produces a CallRecord: wall latency (including retries and backoff),
+# time to first token (the full latency for non-streaming calls), input/output tokens
+# as reported by the provider, the number of retries, and the error class when the
+# call failed. Records go to every registered sink; with no sinks nothing is kept.
+#
+#   metrics = add_sink(InMemoryMetrics())
+#   add_sink(JsonlSink("llm_calls.jsonl"))
+#   ... chat_with_model(...) ...
+#   metrics.summary()   # per (provider, model): count, errors, p50/p90/p99 latency, tokens
+#
+# Rate-limit errors (HTTP 429), 5xx responses and connection failures are retried
+# with exponential backoff and full jitter, honouring retry-after headers; the SDK
+# clients are built without their own retries so each attempt is counted here.
+
+CallRecord = namedtuple('CallRecord', 'time provider model kind latency ttft input_tokens output_tokens '
+                                      'retries error cached')
+
+PERCENTILES = (50, 90, 99)
+
+
+def is_rate_limit(exc):
+    return getattr(exc, 'status_code', None) == 429 or type(exc).__name__ in ('RateLimitError', 'ResourceExhausted')
+
+
+def is_retryable(exc):
+    status = getattr(exc, 'status_code', None)
+    return (is_rate_limit(exc) or (status is not None and status >= 500)
+            or type(exc).__name__ in ('APIConnectionError', 'APITimeoutError', 'ConnectError', 'ReadTimeout'))
+
+
+def _retry_after(exc):
+    # Seconds the server asked us to wait, if it said so
+    headers = getattr(getattr(exc, 'response', None), 'headers', None) or {}
+    try:
+        if 'retry-after-ms' in headers:
+            return float(headers['retry-after-ms']) / 1000
+        if 'retry-after' in headers:
+            return float(headers['retry-after'])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+class RetryPolicy:
+    def __init__(self, max_retries=3, base_delay=1.0, max_delay=30.0, retry_on=is_retryable):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_on = retry_on
+
+    def should_retry(self, exc, attempt):
+        return attempt < self.max_retries and self.retry_on(exc)
+
+    def delay(self, attempt, exc=None):
+        # Full jitter: uniform in [0, base * 2**attempt], capped; at least retry-after
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        retry_after = _retry_after(exc) if exc is not None else None
+        return min(self.max_delay, max(backoff, retry_after or 0))
+
+
+retry_policy = RetryPolicy()
+SINKS = []
+_sinks_lock = threading.Lock()
+
+
+def set_retry_policy(policy):
+    global retry_policy
+    retry_policy = policy
+
+
+def add_sink(sink):
+    with _sinks_lock:
+        SINKS.append(sink)
+    return sink
+
+
+def remove_sink(sink):
+    with _sinks_lock:
+        SINKS.remove(sink)
+
+
+def record_call(provider, model, kind, start, first_token=None, usage=None, retries=0, error=None, cached=False):
+    if not SINKS:
+        return None
+    now = time.perf_counter()
+    usage = usage or {}
+    record = CallRecord(time.time(), provider, model, kind, now - start,
+                        (first_token if first_token is not None else now) - start,
+                        usage.get('input_tokens'), usage.get('output_tokens'), retries,
+                        type(error).__name__ if error is not None else None, cached)
+    for sink in list(SINKS):
+        sink.record(record)
+    return record
+
+
+def call_with_retries(call, provider, model, kind='chat'):
+    # call() -> (text, usage); retried per retry_policy and recorded
+    start = time.perf_counter()
+    attempt = 0
+    while True:
+        try:
+            text, usage = call()
+        except Exception as exc:
+            if retry_policy.should_retry(exc, attempt):
+                time.sleep(retry_policy.delay(attempt, exc))
+                attempt += 1
+                continue
+            record_call(provider, model, kind, start, retries=attempt, error=exc)
+            raise
+        record_call(provider, model, kind, start, usage=usage, retries=attempt)
+        return text
+
+
+async def acall_with_retries(call, provider, model, kind='achat'):
+    # Async counterpart; call() returns an awaitable of (text, usage)
+    import asyncio
+    start = time.perf_counter()
+    attempt = 0
+    while True:
+        try:
+            text, usage = await call()
+        except Exception as exc:
+            if retry_policy.should_retry(exc, attempt):
+                await asyncio.sleep(retry_policy.delay(attempt, exc))
+                attempt += 1
+                continue
+            record_call(provider, model, kind, start, retries=attempt, error=exc)
+            raise
+        record_call(provider, model, kind, start, usage=usage, retries=attempt)
+        return text
+
+
+def _percentile(sorted_values, q):
+    # Linear interpolation between closest ranks
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (position - low)
+
+
+class InMemoryMetrics:
+    def __init__(self):
+        self.records = []
+        self._lock = threading.Lock()
+
+    def record(self, record):
+        with self._lock:
+            self.records.append(record)
+
+    def clear(self):
+        with self._lock:
+            self.records = []
+
+    def summary(self, by=('provider', 'model')):
+        # One dict per group: call/error/retry/cache counts, latency and TTFT
+        # percentiles (seconds) over successful uncached calls, and token totals
+        groups = {}
+        with self._lock:
+            records = list(self.records)
+        for record in records:
+            groups.setdefault(tuple(getattr(record, field) for field in by), []).append(record)
+        rows = []
+        for key, group in groups.items():
+            live = [r for r in group if r.error is None and not r.cached]
+            latency = sorted(r.latency for r in live)
+            ttft = sorted(r.ttft for r in live)
+            row = dict(zip(by, key))
+            row.update(calls=len(group), errors=sum(r.error is not None for r in group),
+                       cached=sum(r.cached for r in group), retries=sum(r.retries for r in group),
+                       input_tokens=sum(r.input_tokens or 0 for r in group),
+                       output_tokens=sum(r.output_tokens or 0 for r in group))
+            for q in PERCENTILES:
+                row[f'latency_p{q}'] = _percentile(latency, q)
+            for q in PERCENTILES:
+                row[f'ttft_p{q}'] = _percentile(ttft, q)
+            rows.append(row)
+        return rows
+
+
+class JsonlSink:
+    # One JSON object per call, appended to path
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def record(self, record):
+        line = json.dumps(record._asdict())
+        with self._lock, open(self.path, 'a') as f:
+            f.write(line + '\n')
+
+
+def load_jsonl(path):
+    # CallRecords written by a JsonlSink, e.g. to summarize an earlier run
+    with open(path) as f:
+        return [CallRecord(**json.loads(line)) for line in f if line.strip()]
@@ -0,0 +1,424 @@
+import os
+import threading
+import time
+import weakref
+
+# Provider backends. Each provider is a plugin object that knows its model-name
+# prefixes, how to build (and cache) its SDK client, and how to chat or stream with
+# it. SDKs are imported the first time a provider builds a client, so importing
+# this module is cheap and a missing SDK only matters for the provider that needs it
+# (asyncio is also only imported by the async paths).
+#
+# Model names are matched against the providers' prefixes in registration order;
+# names that match nothing go to DEFAULT_PROVIDER. A new backend subclasses
+# Provider and is added with register_provider().
+
+MAX_TOKENS = 500  # Anthropic requires an explicit limit
+DEFAULT_PROVIDER = 'ollama'
+
+
+class ClientRegistry:
+    # One client per (provider, credentials, base_url), shared by every call and thread.
+    # The SDK clients keep a pool of keep-alive HTTP connections, so reusing them saves
+    # the TCP/TLS setup of each request.
+    def __init__(self):
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, factory):
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = factory()
+                    self._clients[key] = client
+        return client
+
+    def clear(self):
+        # Drop all cached clients and close their connection pools
+        with self._lock:
+            clients, self._clients = self._clients, {}
+        for client in clients.values():
+            close = getattr(client, 'close', None)
+            if callable(close):
+                close()
+
+
+class OllamaModels:
+    # Locally available Ollama models per host, listed once and reused until
+    # invalidate() (or after ttl seconds when ttl is set)
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def names(self, client, host=None):
+        with self._lock:
+            cached = self._models.get(host)
+            if cached is not None and (self.ttl is None or time.monotonic() - cached[0] < self.ttl):
+                return cached[1]
+            models = client.list().get('models', [])
+            names = set()
+            for m in models:
+                name = m.get('model') or m.get('name')
+                if name:
+                    names.add(name)
+                    names.add(name.removesuffix(':latest'))
+            self._models[host] = (time.monotonic(), names)
+            return names
+
+    def add(self, name, host=None):
+        with self._lock:
+            if host in self._models:
+                self._models[host][1].add(name)
+
+    def invalidate(self, host=None):
+        with self._lock:
+            self._models.pop(host, None)
+
+
+client_registry = ClientRegistry()
+ollama_models = OllamaModels()
+
+# Async HTTP clients belong to the event loop that created them, so they are cached per loop
+_async_registries = weakref.WeakKeyDictionary()
+_async_registries_lock = threading.Lock()
+
+
+def async_registry():
+    import asyncio
+    loop = asyncio.get_running_loop()
+    with _async_registries_lock:
+        registry = _async_registries.get(loop)
+        if registry is None:
+            registry = _async_registries[loop] = ClientRegistry()
+    return registry
+
+
+def _usage(input_tokens, output_tokens):
+    if input_tokens is None and output_tokens is None:
+        return None
+    return {'input_tokens': input_tokens, 'output_tokens': output_tokens}
+
+
+class Provider:
+    # name: registry key; label: provider name reported by create_model_client.
+    # complete/acomplete return (answer text, usage) and chat/achat the text alone;
+    # stream/astream yield (text, usage) pairs. usage is {'input_tokens', 'output_tokens'}
+    # as reported by the provider, or None.
+    # Clients are built without SDK-level retries; llm_metrics retries and counts them.
+    name = None
+    label = None
+    api_key_env = None
+    default_base_url = None
+
+    def __init__(self, prefixes=()):
+        self.prefixes = tuple(prefixes)
+
+    def matches(self, model_name):
+        return model_name.startswith(self.prefixes)
+
+    def client_key(self, base_url):
+        api_key = os.getenv(self.api_key_env) if self.api_key_env else None
+        return self.name, api_key, base_url or self.default_base_url
+
+    def client(self, model_name, base_url=None):
+        key = self.client_key(base_url)
+        return client_registry.get(key, lambda: self.create_client(key[1], key[2]))
+
+    def async_client(self, model_name, base_url=None):
+        # Native async client, or None to run the blocking client in the thread pool
+        key = self.client_key(base_url)
+        return async_registry().get(key, lambda: self.create_async_client(key[1], key[2]))
+
+    def create_client(self, api_key, base_url):
+        raise NotImplementedError
+
+    def create_async_client(self, api_key, base_url):
+        return None
+
+    def complete(self, client, model, messages):
+        # (answer text, usage)
+        raise NotImplementedError
+
+    async def acomplete(self, client, model, messages):
+        raise NotImplementedError
+
+    def chat(self, client, model, messages):
+        return self.complete(client, model, messages)[0]
+
+    async def achat(self, client, model, messages):
+        return (await self.acomplete(client, model, messages))[0]
+
+    def stream(self, client, model, messages):
+        raise ValueError(f"Streaming is not supported for provider: {self.label}")
+
+    async def astream(self, client, model, messages):
+        raise ValueError(f"Streaming is not supported for provider: {self.label}")
+        yield
+
+
+class OpenAIProvider(Provider):
+    # Chat Completions API; also serves OpenAI-compatible endpoints such as Grok
+    name = 'openai'
+    label = 'OpenAI'
+    api_key_env = 'OPENAI_API_KEY'
+    stream_usage = True  # usage on the last chunk via stream_options
+
+    def __init__(self, prefixes=(), name=None, label=None, api_key_env=None, default_base_url=None):
+        super().__init__(prefixes)
+        self.name = name or self.name
+        self.label = label or self.label
+        self.api_key_env = api_key_env or self.api_key_env
+        self.default_base_url = default_base_url or self.default_base_url
+
+    def sdk(self):
+        import openai
+        return openai.OpenAI, openai.AsyncOpenAI
+
+    def create_client(self, api_key, base_url):
+        return self.sdk()[0](api_key=api_key, base_url=base_url, max_retries=0)
+
+    def create_async_client(self, api_key, base_url):
+        return self.sdk()[1](api_key=api_key, base_url=base_url, max_retries=0)
+
+    @staticmethod
+    def _result(response):
+        usage = response.usage
+        return (response.choices[0].message.content,
+                _usage(usage.prompt_tokens, usage.completion_tokens) if usage is not None else None)
+
+    def complete(self, client, model, messages):
+        return self._result(client.chat.completions.create(model=model, messages=messages))
+
+    async def acomplete(self, client, model, messages):
+        return self._result(await client.chat.completions.create(model=model, messages=messages))
+
+    def _stream_kwargs(self, model, messages):
+        kwargs = dict(model=model, messages=messages, stream=True)
+        if self.stream_usage:
+            kwargs['stream_options'] = {'include_usage': True}
+        return kwargs
+
+    @staticmethod
+    def _chunk_event(chunk):
+        # Groq reports usage under x_groq instead of usage
+        usage = getattr(chunk, 'usage', None) or getattr(getattr(chunk, 'x_groq', None), 'usage', None)
+        text = chunk.choices[0].delta.content if chunk.choices else None
+        return text, _usage(usage.prompt_tokens, usage.completion_tokens) if usage is not None else None
+
+    def stream(self, client, model, messages):
+        for chunk in client.chat.completions.create(**self._stream_kwargs(model, messages)):
+            yield self._chunk_event(chunk)
+
+    async def astream(self, client, model, messages):
+        async for chunk in await client.chat.completions.create(**self._stream_kwargs(model, messages)):
+            yield self._chunk_event(chunk)
+
+
+class GroqProvider(OpenAIProvider):
+    name = 'groq'
+    label = 'Groq'
+    api_key_env = 'GROQ_API_KEY'
+    stream_usage = False
+
+    def sdk(self):
+        import groq
+        return groq.Groq, groq.AsyncGroq
+
+
+class AnthropicProvider(Provider):
+    name = 'anthropic'
+    label = 'Anthropic'
+    api_key_env = 'ANTHROPIC_API_KEY'
+
+    def create_client(self, api_key, base_url):
+        from anthropic import Anthropic
+        return Anthropic(api_key=api_key, base_url=base_url, max_retries=0)
+
+    def create_async_client(self, api_key, base_url):
+        from anthropic import AsyncAnthropic
+        return AsyncAnthropic(api_key=api_key, base_url=base_url, max_retries=0)
+
+    @staticmethod
+    def request(model, messages):
+        # The system prompt is a separate parameter, not a message
+        kwargs = dict(model=model, messages=[msg for msg in messages if msg["role"] != "system"],
+                      max_tokens=MAX_TOKENS)
+        system = [msg["content"] for msg in messages if msg["role"] == "system"]
+        if system:
+            kwargs['system'] = system[0]
+        return kwargs
+
+    @staticmethod
+    def _result(response):
+        return response.content[0].text, _usage(response.usage.input_tokens, response.usage.output_tokens)
+
+    def complete(self, client, model, messages):
+        return self._result(client.messages.create(**self.request(model, messages)))
+
+    async def acomplete(self, client, model, messages):
+        return self._result(await client.messages.create(**self.request(model, messages)))
+
+    def stream(self, client, model, messages):
+        with client.messages.stream(**self.request(model, messages)) as stream:
+            for text in stream.text_stream:
+                yield text, None
+            usage = stream.get_final_message().usage
+        yield None, _usage(usage.input_tokens, usage.output_tokens)
+
+    async def astream(self, client, model, messages):
+        async with client.messages.stream(**self.request(model, messages)) as stream:
+            async for text in stream.text_stream:
+                yield text, None
+            usage = (await stream.get_final_message()).usage
+        yield None, _usage(usage.input_tokens, usage.output_tokens)
+
+
+class OllamaProvider(Provider):
+    # Local models; base_url (or OLLAMA_HOST) selects the server. Missing models are
+    # pulled on first use.
+    name = 'ollama'
+    label = 'Ollama'
+
+    def client_key(self, base_url):
+        return self.name, None, base_url or os.getenv('OLLAMA_HOST')
+
+    def create_client(self, api_key, host):
+        import ollama
+        return ollama.Client(host=host)
+
+    def create_async_client(self, api_key, host):
+        import ollama
+        return ollama.AsyncClient(host=host)
+
+    def client(self, model_name, base_url=None):
+        client = super().client(model_name, base_url)
+        host = self.client_key(base_url)[2]
+        if model_name not in ollama_models.names(client, host):
+            print(f"Model '{model_name}' not found locally. Pulling from Ollama...")
+            client.pull(model_name)
+            ollama_models.add(model_name, host)
+            print(f"Successfully pulled model: {model_name}")
+        return client
+
+    def async_client(self, model_name, base_url=None):
+        host = self.client_key(base_url)[2]
+        if model_name not in ollama_models.names(super().client(model_name, base_url), host):
+            return None  # the blocking path pulls the model first (the list is cached)
+        return super().async_client(model_name, base_url)
+
+    @staticmethod
+    def _result(response):
+        return response['message']['content'], _usage(response.get('prompt_eval_count'), response.get('eval_count'))
+
+    def complete(self, client, model, messages):
+        return self._result(client.chat(model=model, messages=messages))
+
+    async def acomplete(self, client, model, messages):
+        return self._result(await client.chat(model=model, messages=messages))
+
+    @staticmethod
+    def _chunk_event(chunk):
+        usage = _usage(chunk.get('prompt_eval_count'), chunk.get('eval_count')) if chunk.get('done') else None
+        return chunk['message']['content'], usage
+
+    def stream(self, client, model, messages):
+        for chunk in client.chat(model=model, messages=messages, stream=True):
+            yield self._chunk_event(chunk)
+
+    async def astream(self, client, model, messages):
+        async for chunk in await client.chat(model=model, messages=messages, stream=True):
+            yield self._chunk_event(chunk)
+
+
+class GeminiProvider(Provider):
+    # google.generativeai keeps its configuration globally, so the "client" is the
+    # module, configured once per key. No native async client: async calls use the
+    # thread pool.
+    name = 'google'
+    label = 'Google Gemini'
+    api_key_env = 'GOOGLE_API_KEY'
+
+    def create_client(self, api_key, base_url):
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        return genai
+
+    def async_client(self, model_name, base_url=None):
+        return None
+
+    @staticmethod
+    def contents(messages):
+        return [{"role": "user" if msg["role"] == "user" else "model", "parts": [msg["content"]]}
+                for msg in messages]
+
+    @staticmethod
+    def _usage_of(response):
+        meta = getattr(response, 'usage_metadata', None)
+        return _usage(meta.prompt_token_count, meta.candidates_token_count) if meta is not None else None
+
+    def complete(self, client, model, messages):
+        response = client.GenerativeModel(model).generate_content(self.contents(messages))
+        return response.text, self._usage_of(response)
+
+    def stream(self, client, model, messages):
+        usage = None
+        for chunk in client.GenerativeModel(model).generate_content(self.contents(messages), stream=True):
+            usage = self._usage_of(chunk) or usage
+            yield chunk.text, None
+        yield None, usage
+
+
+class UnsupportedProvider(Provider):
+    # Reserves a prefix so its models are not sent to the default provider
+    def __init__(self, name, prefixes=()):
+        super().__init__(prefixes)
+        self.name = self.label = name
+
+    def client(self, model_name, base_url=None):
+        raise ValueError(f"Unsupported model provider: {model_name},{self.name}")
+
+    def async_client(self, model_name, base_url=None):
+        return self.client(model_name, base_url)
+
+
+PROVIDERS = {}
+
+
+def register_provider(provider, first=False):
+    # Add or replace a provider; first=True gives its prefixes precedence over the others
+    PROVIDERS.pop(provider.name, None)
+    if first:
+        others = dict(PROVIDERS)
+        PROVIDERS.clear()
+        PROVIDERS[provider.name] = provider
+        PROVIDERS.update(others)
+    else:
+        PROVIDERS[provider.name] = provider
+    return provider
+
+
+def provider_for(model_name):
+    for provider in PROVIDERS.values():
+        if provider.matches(model_name):
+            return provider
+    return PROVIDERS[DEFAULT_PROVIDER]
+
+
+def detect_provider(model_name):
+    return provider_for(model_name).name
+
+
+register_provider(OpenAIProvider(['gpt']))
+register_provider(GeminiProvider(['gemini']))
+register_provider(AnthropicProvider(['claude']))
+register_provider(OpenAIProvider(['grok'], name='grok', label='Grok with OpenAIAPI', api_key_env='GROK_API_KEY',
+                                 default_base_url="https://api.x.ai/v1"))
+register_provider(OllamaProvider(['llama3.2', 'meta', 'deepseek']))
+# from mistralai.client import MistralClient
+register_provider(UnsupportedProvider('mistral', ['mistral', 'mixtral', 'codestral']))
+register_provider(GroqProvider(['groq', 'gemma2-9b-it', 'llama-3.3-70b-versatile', 'llama-3.1-8b-instant',
+                                'llama-guard-3-8b', 'llama3-70b-8192', 'llama3-8b-8192', 'whisper-large-v3',
+                                'whisper-large-v3-turbo', 'distil-whisper-large-v3-en']))
@@ -0,0 +1,163 @@
+import asyncio
+import time
+
+from src import llm_connector
+from src.llm_connector import create_async_model_client, create_model_client
+from src.llm_metrics import record_call
+from src.llm_providers import detect_provider, provider_for
+
+# Token streaming with one interface for every provider: iterate a ChatStream
+# (or `async for` over an AsyncChatStream) to get text chunks as they arrive;
+# afterwards .text holds the assembled answer and .usage the token counts
+# ({'input_tokens': ..., 'output_tokens': ...}, None if the provider sent none).
+#
+#   stream = stream_chat_with_model('claude-3-5-haiku-latest', prompt)
+#   for chunk in stream:
+#       print(chunk, end='', flush=True)
+#   stream.text, stream.usage
+#
+# A cached response (see llm_cache.py) arrives as a single chunk; a finished stream
+# is stored in the cache like a regular call. The per-provider streaming code lives
+# in the providers (Provider.stream / astream in llm_providers.py).
+# Each stream is recorded to the metric sinks (llm_metrics.py) once it ends, with the
+# arrival of the first chunk as time to first token. Streams are not retried: a
+# failure surfaces while iterating.
+
+
+async def _threaded_events(events):
+    # Drive a blocking event iterator from the default thread pool, one chunk per hop
+    loop = asyncio.get_running_loop()
+    done = object()
+    while True:
+        event = await loop.run_in_executor(None, next, events, done)
+        if event is done:
+            return
+        yield event
+
+
+class ChatStream:
+    kind = 'stream'
+
+    def __init__(self, events, cache_key=None, provider=None, model=None, cached=False):
+        self._events = events
+        self._cache_key = cache_key
+        self._call = (provider, model, cached)
+        self._start = time.perf_counter()
+        self._first_token = None
+        self.chunks = []
+        self.usage = None
+        self.done = False
+
+    @property
+    def text(self):
+        return ''.join(self.chunks)
+
+    def _add(self, text, usage):
+        if usage is not None:
+            self.usage = usage
+        if text:
+            if self._first_token is None:
+                self._first_token = time.perf_counter()
+            self.chunks.append(text)
+        return text
+
+    def _record(self, error=None):
+        provider, model, cached = self._call
+        if provider is not None:
+            record_call(provider, model, self.kind, self._start, self._first_token, self.usage, error=error,
+                        cached=cached)
+
+    def _finish(self):
+        self.done = True
+        self._record()
+        if self._cache_key is not None and llm_connector.response_cache is not None:
+            llm_connector.response_cache.set(self._cache_key, self.text)
+
+    def __iter__(self):
+        if self.done:  # already consumed: finishing again would re-cache and re-record
+            return
+        try:
+            for text, usage in self._events:
+                if self._add(text, usage):
+                    yield text
+        except Exception as exc:
+            self._record(exc)
+            raise
+        self._finish()
+
+    def read(self):
+        # Consume whatever is left and return the full text
+        for _ in self:
+            pass
+        return self.text
+
+
+class AsyncChatStream(ChatStream):
+    kind = 'astream'
+
+    async def __aiter__(self):
+        if self.done:
+            return
+        try:
+            async for text, usage in self._events:
+                if self._add(text, usage):
+                    yield text
+        except Exception as exc:
+            self._record(exc)
+            raise
+        self._finish()
+
+    async def read(self):
+        async for _ in self:
+            pass
+        return self.text
+
+
+def _cached_events(response):
+    yield response, None
+
+
+async def _acached_events(response):
+    yield response, None
+
+
+def stream_chat_with_model_history(model_name, messages, base_url=None, bypass_cache=False):
+    key, cached = llm_connector._cache_lookup(model_name, messages, base_url, bypass_cache)
+    if cached is not None:
+        return ChatStream(_cached_events(cached), provider=detect_provider(model_name), model=model_name,
+                          cached=True)
+    provider = provider_for(model_name)
+    client, model, _ = llm_connector._create_client(create_model_client, model_name, base_url, ChatStream.kind,
+                                                    time.perf_counter())
+    return ChatStream(provider.stream(client, model, messages), key, provider.name, model)
+
+
+def stream_chat_with_model(model_name, user_message, system_message=None, base_url=None, bypass_cache=False):
+    return stream_chat_with_model_history(model_name, llm_connector._messages(user_message, system_message),
+                                          base_url, bypass_cache)
+
+
+def astream_chat_with_model_history(model_name, messages, base_url=None, bypass_cache=False):
+    # Call from inside the event loop; providers without a native async client
+    # stream through the thread pool
+    key, cached = llm_connector._cache_lookup(model_name, messages, base_url, bypass_cache)
+    if cached is not None:
+        return AsyncChatStream(_acached_events(cached), provider=detect_provider(model_name), model=model_name,
+                               cached=True)
+    provider = provider_for(model_name)
+    start = time.perf_counter()
+    created = llm_connector._create_client(create_async_model_client, model_name, base_url, AsyncChatStream.kind,
+                                           start)
+    if created is None:
+        client, model, _ = llm_connector._create_client(create_model_client, model_name, base_url,
+                                                        AsyncChatStream.kind, start)
+        events = _threaded_events(provider.stream(client, model, messages))
+    else:
+        client, model, _ = created
+        events = provider.astream(client, model, messages)
+    return AsyncChatStream(events, key, provider.name, model)
+
+
+def astream_chat_with_model(model_name, user_message, system_message=None, base_url=None, bypass_cache=False):
+    return astream_chat_with_model_history(model_name, llm_connector._messages(user_message, system_message),
+                                           base_url, bypass_cache)